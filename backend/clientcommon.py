@@ -0,0 +1,278 @@
+# clientcommon.py - MCP/LLM plumbing shared by the mcpclient and clientreset assistants
+#
+# The workflow (states, prompts, memory) stays in each assistant module; this
+# holds the connection, caching and model setup they have in common.
+
+import asyncio
+import hashlib
+import httpx
+import orjson
+import os
+import time
+from typing import Optional, List, Dict, Tuple
+from contextlib import AsyncExitStack
+from mcp import ClientSession, Tool
+from mcp.client.sse import sse_client
+from langchain_ollama import ChatOllama
+from langchain_core.messages import BaseMessage, HumanMessage
+
+# Seconds to reuse a successful result of a read-only, slowly changing tool.
+# The process-id lookup is kept short so concurrent creations don't collide;
+# process/field lookups only need to cover a user re-typing the same name.
+_TOOL_CACHE_TTL: Dict[str, float] = {
+    "get_field_display_types": 300.0,
+    "get_field_validation_types": 300.0,
+    "get_organization_by_name": 60.0,
+    "get_process_by_name": 30.0,
+    "check_field_exists": 30.0,
+    "check_fields_exist_batch": 30.0,
+    "get_max_process_id": 5.0,
+}
+_TOOL_CACHE_MAX = 256
+
+# Ollama reuses the KV cache of the longest prompt prefix it has already seen,
+# which here is each assistant's _SYSTEM_PROMPT_RULES. A context size that
+# differs from the loaded one makes Ollama reload the model and drop that
+# cache, so pin it with OLLAMA_NUM_CTX (unset keeps the model's own default).
+_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0")) or None
+
+# Only short free-form replies reach the LLM now that fixed wording comes
+# from the assistants' _RESPONSE_TEMPLATES, so decoding is capped (0 lifts the
+# cap) and a 4-bit build of the model is a good fit, e.g.
+#   ollama create mistral-sql-3k:q4_K_M -q q4_K_M -f Modelfile
+#   OLLAMA_MODEL=mistral-sql-3k:q4_K_M
+MODEL_NAME = os.getenv("OLLAMA_MODEL", "mistral-sql-3k:latest")
+_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "160")) or None
+
+# Optional Redis cache for LLM fallback replies, shared by every process that
+# points at it. Off unless REPLY_CACHE_REDIS_URL is set.
+_REPLY_CACHE_URL = os.getenv("REPLY_CACHE_REDIS_URL")
+_REPLY_CACHE_TTL = int(os.getenv("REPLY_CACHE_TTL", "3600"))
+
+try:
+    # mcp >= 2 builds its transports on httpx2 and follows redirects itself.
+    import httpx2 as _mcp_httpx
+    _MCP_FOLLOW_REDIRECTS = False
+except ImportError:
+    _mcp_httpx = httpx
+    _MCP_FOLLOW_REDIRECTS = True
+
+def mcp_http_client(headers=None, timeout=None, auth=None):
+    """httpx client for the MCP SSE transport (sse_client's httpx_client_factory).
+
+    Each tool call is a POST next to the long-lived event stream. httpx drops
+    idle keep-alive connections after 5s by default, so after the user's
+    think time nearly every call would reconnect; keep them for 5 minutes.
+    """
+    return _mcp_httpx.AsyncClient(
+        headers=headers,
+        timeout=timeout,
+        auth=auth,
+        follow_redirects=_MCP_FOLLOW_REDIRECTS,
+        limits=_mcp_httpx.Limits(max_keepalive_connections=100, max_connections=200, keepalive_expiry=300),
+    )
+
+class SharedMCP:
+    """The process-wide MCP SSE connection, shared by every assistant.
+
+    Only the connection and the server's tool listing are shared; memory and
+    history stay on each assistant.
+    """
+    session: Optional[ClientSession] = None
+    tools: List[Tool] = []
+    _stack: Optional[AsyncExitStack] = None
+    _lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    async def ensure(cls, url: str) -> Tuple[ClientSession, List[Tool]]:
+        """Open the connection on first use and return (session, server tools)"""
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        async with cls._lock:
+            if cls.session is None:
+                stack = AsyncExitStack()
+                try:
+                    streams = await stack.enter_async_context(
+                        sse_client(url=url, httpx_client_factory=mcp_http_client)
+                    )
+                    session = await stack.enter_async_context(ClientSession(*streams))
+                    await session.initialize()
+                    tools_response = await session.list_tools()
+                except BaseException:
+                    await stack.aclose()
+                    raise
+                cls._stack, cls.session, cls.tools = stack, session, tools_response.tools
+        return cls.session, cls.tools
+
+    @classmethod
+    async def close(cls):
+        """Drop the shared connection; the next ensure() opens a fresh one"""
+        stack = cls._stack
+        cls._stack, cls.session, cls.tools, cls._lock = None, None, [], None
+        if stack is not None:
+            await stack.aclose()
+
+class ReplyCache:
+    """Redis cache of LLM replies keyed by the turn's state context and message.
+
+    The key covers the model, the system prompts (state, action, tool result)
+    and the normalized user message, but not the conversation history: the
+    history holds earlier sampled replies, so keying on it would only hit on
+    a byte-identical replay. Redis errors only skip the cache.
+    """
+    _client = None
+
+    @staticmethod
+    def key(llm: ChatOllama, messages: List[BaseMessage]) -> Optional[str]:
+        if not _REPLY_CACHE_URL:
+            return None
+        digest = hashlib.blake2s(llm.model.encode())
+        # messages is [rules, turn state, *history, user message].
+        for message in messages[:2]:
+            digest.update(b"\0" + message.content.encode())
+        user_message = " ".join(messages[-1].content.lower().split())
+        digest.update(b"\0" + user_message.encode())
+        return "reply:" + digest.hexdigest()
+
+    @classmethod
+    def _redis(cls):
+        if cls._client is None:
+            import redis.asyncio
+            cls._client = redis.asyncio.Redis.from_url(_REPLY_CACHE_URL)
+        return cls._client
+
+    @classmethod
+    async def get(cls, key: str) -> Optional[str]:
+        try:
+            value = await cls._redis().get(key)
+        except Exception as e:
+            print(f" Reply cache lookup failed: {e}")
+            return None
+        return value.decode() if value is not None else None
+
+    @classmethod
+    async def set(cls, key: str, reply: str):
+        try:
+            await cls._redis().setex(key, _REPLY_CACHE_TTL, reply)
+        except Exception as e:
+            print(f" Reply cache store failed: {e}")
+
+    @classmethod
+    async def close(cls):
+        """Drop the client; its connections belong to the current event loop"""
+        client, cls._client = cls._client, None
+        if client is not None:
+            await client.aclose()
+
+class MCPAssistantBase:
+    """MCP connection, tool calls and model setup for an assistant.
+
+    Subclasses set `allowed_tools` (the server tools they may use) and hold
+    the workflow memory and conversation history.
+    """
+    # Results for _TOOL_CACHE_TTL tools: key -> (expires_at, result). Shared by
+    # all instances on purpose; it holds database lookups, not conversation.
+    _tool_cache: Dict[str, Tuple[float, str]] = {}
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        # keep_alive=-1 keeps the model resident in Ollama between turns instead
+        # of unloading it after the default 5 idle minutes. Run Ollama with
+        # OLLAMA_NUM_PARALLEL matching the API's CHAT_CONCURRENCY. The async
+        # client keeps a keep-alive pool across turns; generations get no read
+        # timeout (ollama's default) but a down server fails fast on connect.
+        self.llm = ChatOllama(
+            model=model_name, temperature=0.7, keep_alive=-1,
+            num_ctx=_NUM_CTX, num_predict=_NUM_PREDICT,
+            async_client_kwargs={
+                "limits": httpx.Limits(max_connections=200, max_keepalive_connections=100),
+                "timeout": httpx.Timeout(None, connect=5.0),
+            },
+        )
+        self.session: Optional[ClientSession] = None
+        self.tools: List[Tool] = []
+        self.mcp_url = "http://localhost:8000/sse"
+
+    async def reopen(self):
+        """(Re)open the event-loop-bound, shared MCP connection.
+
+        __init__ only builds cheap, fork-safe state, so an instance created at
+        import time (e.g. in a gunicorn --preload master) is reopened here by
+        each worker after fork.
+        """
+        # Whatever connection the process held belongs to another event loop
+        # (or process), so start a fresh one.
+        await SharedMCP.close()
+        await ReplyCache.close()
+        self.session = None
+        await self.initialize()
+
+    async def initialize(self):
+        """Attach to the shared MCP connection (opening it via SSE if needed), then warm the model"""
+        try:
+            self.session, all_server_tools = await SharedMCP.ensure(self.mcp_url)
+            self.tools = [
+                tool for tool in all_server_tools
+                if tool.name in self.allowed_tools
+            ]
+            print(f" Connected to MCP server with {len(self.tools)} tools")
+        except Exception as e:
+            print(f" Failed to connect to MCP server: {e}")
+            raise
+        await self._warmup()
+
+    async def _warmup(self):
+        """Have Ollama load the model now instead of on the first user turn"""
+        options = {"num_predict": 1}
+        if _NUM_CTX:
+            # Any other context size would make the first real call reload it.
+            options["num_ctx"] = _NUM_CTX
+        try:
+            await self.llm.ainvoke([HumanMessage(content="hi")], options=options)
+        except Exception as e:
+            print(f" Model warm-up failed: {e}")
+
+    @staticmethod
+    def _tool_key(tool_name: str, arguments: dict) -> str:
+        return tool_name + orjson.dumps(arguments, option=orjson.OPT_SORT_KEYS).decode()
+
+    async def _call_tool(self, tool_name: str, arguments: dict) -> str:
+        """Call MCP tool, using a cached result when there is one"""
+        ttl = _TOOL_CACHE_TTL.get(tool_name)
+        if ttl is None:
+            return await self._call_tool_remote(tool_name, arguments)
+
+        key = self._tool_key(tool_name, arguments)
+        cached = self._tool_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        result = await self._call_tool_remote(tool_name, arguments)
+        # Some tools report a DB failure as success with an "error" key (e.g. a
+        # field lookup that fell back to "not found"); never cache those.
+        try:
+            data = orjson.loads(result)
+            succeeded = data.get("success") is True and "error" not in data
+        except (orjson.JSONDecodeError, AttributeError):
+            succeeded = False
+        if succeeded:
+            cache = self._tool_cache
+            cache.pop(key, None)
+            if len(cache) >= _TOOL_CACHE_MAX:
+                del cache[next(iter(cache))]
+            cache[key] = (time.monotonic() + ttl, result)
+        return result
+
+    async def _call_tool_remote(self, tool_name: str, arguments: dict) -> str:
+        """Call MCP tool directly"""
+        try:
+            result = await self.session.call_tool(tool_name, arguments)
+            if result.content:
+                return result.content[0].text
+            return orjson.dumps({"success": False, "error": "No result"}).decode()
+        except Exception as e:
+            return orjson.dumps({"success": False, "error": str(e)}).decode()
+
+    async def close(self):
+        """Close the shared MCP connection (process shutdown)"""
+        self.session = None
+        await SharedMCP.close()
+        await ReplyCache.close()
@@ -1,12 +1,131 @@
 import asyncio
-import json
+import orjson
 import re
-from typing import Optional, List, Dict, Any
-from contextlib import AsyncExitStack
-from mcp import ClientSession, Tool
-from mcp.client.sse import sse_client
-from langchain_ollama import ChatOllama
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from collections import deque
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable, Deque, Set, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from clientcommon import MCPAssistantBase, MODEL_NAME, ReplyCache
+
+# Keyword sets for the state machine, built once instead of as list literals
+# on every turn.
+_IDLE_TRIGGERS = re.compile(r"\b(?:create|form|page|build|yes)")
+_WORD = re.compile(r"\w+")
+_START_WORDS = frozenset({"yes", "ok", "sure", "proceed", "start"})
+_SKIP_WORDS = frozenset({"ok", "next", "continue", "proceed"})
+_DONE_WORDS = frozenset({"done", "finish", "complete", "no more fields"})
+# Each confirm state keeps its own yes/no vocabulary, matched as whole words.
+_PROCESS_CONFIRM_YES = frozenset({"yes", "y", "create", "ok", "sure", "proceed"})
+_PROCESS_CONFIRM_NO = frozenset({"no", "n", "wrong", "cancel", "retry"})
+_FIELD_CONFIRM_YES = frozenset({"yes", "y", "create", "ok", "sure"})
+_FIELD_CONFIRM_NO = frozenset({"no", "n", "cancel", "skip"})
+# Commands answered straight from memory, keyed by the lowercased input.
+_COMMANDS: Dict[str, Callable[["MCPAIAssistant"], str]] = {
+    "show memory": lambda assistant: assistant.memory.get_summary(),
+    "show state": lambda assistant: assistant.memory.get_summary(),
+    "status": lambda assistant: assistant.memory.get_summary(),
+}
+# Matched against the lowercased input.
+_PROCESS_ID_Q = re.compile(r"\bprocess\b.*\bid\b|\bid\b.*\bprocess\b")
+# Separators when several field IDs are pasted into one message.
+_FIELD_SEP = re.compile(r"[,\s]+")
+# Without a comma, a multi-word message is only a paste if every word is one.
+_FIELD_ID = re.compile(r"\w+")
+_DISPLAY_TYPES = ("label", "checkbox", "radio", "textarea", "select", "date")
+_DISPLAY_TYPE_SET = frozenset(_DISPLAY_TYPES)
+
+# Replies for actions whose wording is fixed by the CRITICAL RESPONSE RULES
+# below. They only need values the state machine already holds, so they
+# are formatted directly instead of asking the LLM to copy them out.
+_RESPONSE_TEMPLATES: Dict[str, str] = {
+    "workflow_started": "Great! Which organization is this form page for? (Provide the legal name)",
+    "organization_found": "Found {org_name} (ID: {org_id}). Which process should this form page belong to?",
+    "organization_not_found": "Organization not found. Please provide the exact legal name.",
+    "ask_for_org_name": "Which organization is this form page for? (Provide the legal name)",
+    "ask_for_process_name": "Which process should this form page belong to? (Provide the process name)",
+    "process_found": "Found process '{process_name}' (ID: {process_id}). Moving to next step...",
+    "process_not_found_ask_create": "Process '{process_name}' does not exist in the database. Do you want to create a new process with ID {suggested_process_id}? (yes/no)",
+    "new_process_confirmed": "Perfect! New process '{process_name}' will be created with ID {process_id}. Event ID {process_id} and Page ID {process_id} will be used. What should the page title be?",
+    "process_name_retry": "Okay, let's try again. Which process should this form page belong to? (Provide the correct process name)",
+    "unclear_process_response": "Please respond with 'yes' to create the new process, or 'no' if the process name was incorrect.",
+    "event_id_retrieved": "Event ID: {event_id} assigned. What should the page title be?",
+    "process_and_event_ready": "Found process '{process_name}' (ID: {process_id}). Event ID: {event_id} assigned. What should the page title be?",
+    "ask_for_page_title": "What should the page title be? (e.g., 'Task Details')",
+    "page_title_set": "Page '{page_title}' created with URL: {page_url}. Ready to add fields. What field ID do you want to add? (or say 'done')",
+    "ask_for_fields": "What field ID do you want to add? (Provide field ID, or say 'done' to finish)",
+    "field_added_existing": "Field '{field_id}' added ({field_count} total). Add another field or say 'done'.",
+    "field_not_found_ask_create": "Field '{field_id}' does not exist in adminFields table. Do you want to create a new field with this fieldId? (yes/no)",
+    "new_field_confirmed": "Great! What display type for field '{pending_field_id}'? (label/checkbox/radio/textarea/select/date)",
+    "display_type_set": "Display type set to '{display_type}'. What validation type? (E=Email, N=Numeric, M=Mandatory, NM=Not Mandatory, A=Alphabetic, AN=Alphanumeric)",
+    "field_added_new": "New field '{field_id}' will be created ({field_count} total). Add another field or say 'done'.",
+    "field_creation_cancelled": "Field creation cancelled. Please provide another field ID or type 'done' to finish.",
+    "unclear_field_response": "Please respond with 'yes' to create the new field, or 'no' to skip this field.",
+    "invalid_display_type": "Invalid display type. Please choose from: label, checkbox, radio, textarea, select, date",
+    "no_fields_added": "You haven't added any fields yet. Please add at least one field.",
+    "fields_added": "Fields {field_id} added ({field_count} total). Add another field or say 'done'.",
+    "fields_already_added": "Already added: {field_id} ({field_count} total). Add another field or say 'done'.",
+    "fields_complete": "Collected {field_count} fields. Generating SQL...",
+    "workflow_already_complete": "The SQL for page '{page_title}' has already been generated. Reset the conversation to create another form page.",
+}
+
+# The unchanging part of the system prompt, built once. It goes first so the
+# model server can reuse its prefix cache across turns; the per-turn state
+# and tool result follow in a second system message.
+_SYSTEM_PROMPT_RULES = SystemMessage(content="""You are a helpful assistant for form page creation.
+
+CRITICAL RESPONSE RULES:
+- If action_taken is "workflow_started", respond: "Great! Which organization is this form page for? (Provide the legal name)"
+- If action_taken is "organization_found", respond: "Found [orgName] (ID: [orgId]). Which process should this form page belong to?"
+- If action_taken is "ask_for_process_name", respond: "Which process should this form page belong to? (Provide the process name)"
+- If action_taken is "process_found", respond: "Found process '[processName]' (ID: [processId]). Moving to next step..."
+- If action_taken is "process_not_found_ask_create", respond: "Process '[process_name]' does not exist in the database. Do you want to create a new process with ID [suggested_process_id]? (yes/no)"
+- If action_taken is "new_process_confirmed", respond: "Perfect! New process '[process_name]' will be created with ID [process_id]. Event ID [process_id] and Page ID [process_id] will be used. What should the page title be?"
+- If action_taken is "process_name_retry", respond: "Okay, let's try again. Which process should this form page belong to? (Provide the correct process name)"
+- If action_taken is "unclear_process_response", respond: "Please respond with 'yes' to create the new process, or 'no' if the process name was incorrect."
+- If action_taken is "event_id_retrieved", respond: "Event ID: [eventId] assigned. What should the page title be?"
+- If action_taken is "ask_for_page_title", respond: "What should the page title be? (e.g., 'Task Details')"
+- If action_taken is "page_title_set", respond: "Page '[pageTitle]' created with URL: [pageURL]. Ready to add fields. What field ID do you want to add? (or say 'done')"
+- If action_taken is "ask_for_fields", respond: "What field ID do you want to add? (Provide field ID, or say 'done' to finish)"
+- If action_taken is "field_added_existing", respond: "Field '[field_id]' added ([field_count] total). Add another field or say 'done'."
+- If action_taken is "field_not_found_ask_create", respond: "Field '[field_id]' does not exist in adminFields table. Do you want to create a new field with this fieldId? (yes/no)"
+- If action_taken is "new_field_confirmed", respond: "Great! What display type for field '[pending_field_id]'? (label/checkbox/radio/textarea/select/date)"
+- If action_taken is "display_type_set", respond: "Display type set to '[display_type]'. What validation type? (E=Email, N=Numeric, M=Mandatory, NM=Not Mandatory, A=Alphabetic, AN=Alphanumeric)"
+- If action_taken is "field_added_new", respond: "New field '[field_id]' will be created ([field_count] total). Add another field or say 'done'."
+- If action_taken is "field_creation_cancelled", respond: "Field creation cancelled. Please provide another field ID or type 'done' to finish."
+- If action_taken is "unclear_field_response", respond: "Please respond with 'yes' to create the new field, or 'no' to skip this field."
+- If action_taken is "invalid_display_type", respond: "Invalid display type. Please choose from: label, checkbox, radio, textarea, select, date"
+- If action_taken is "no_fields_added", respond: "You haven't added any fields yet. Please add at least one field."
+- If action_taken is "fields_complete", respond: "Collected [field_count] fields. Generating SQL..."
+- If action_taken is "sql_generated", output the raw SQL from tool_result without modification
+- If action_taken is "organization_not_found", respond: "Organization not found. Please provide the exact legal name."
+- If action_taken is "ask_for_org_name", respond: "Which organization is this form page for? (Provide the legal name)"
+
+Extract exact values from tool_result and the context below and provide clear response.""")
+
+# Per-turn context sent after _SYSTEM_PROMPT_RULES on the LLM fallback path.
+_TURN_PROMPT = """CURRENT STATE: {current_state}
+ACTION TAKEN: {action_taken}
+
+TOOL RESULT:
+{tool_result}
+
+Additional context:
+- field_id: {field_id}
+- field_count: {field_count}
+- process_name: {process_name}
+- suggested_process_id: {suggested_process_id}
+- process_id: {process_id}
+- display_type: {display_type}
+- pending_field_id: {pending_field_id}"""
+
+# Prior messages (two per turn) included in the LLM prompt.
+_HISTORY_MESSAGES = 4
+
+def _display_label(field_id: str) -> str:
+    """Label shown for a field on the page, e.g. "phone_number" -> "Phone Number"
+
+    Computed once when the field is collected, not on every SQL build.
+    """
+    return field_id.replace("_", " ").title()
 
 class WorkflowState:
     """Enum-like class for workflow states"""
@@ -25,6 +144,14 @@ class WorkflowState:
 
 class WorkflowMemory:
     """Structured memory for form page creation workflow"""
+    __slots__ = (
+        "org_id", "org_name", "process_id", "process_name", "is_new_process",
+        "suggested_process_id", "event_id", "page_id", "page_title",
+        "page_url", "group_id", "fields", "existing_fields", "new_fields",
+        "current_state", "pending_field_id",
+        "pending_display_type", "pending_validation_type", "queued_field_ids",
+    )
+
     def __init__(self):
         self.org_id: Optional[str] = None
         self.org_name: Optional[str] = None
@@ -38,10 +165,16 @@ class WorkflowMemory:
         self.page_url: Optional[str] = None
         self.group_id: int = 1
         self.fields: List[Dict[str, Any]] = []
+        # The same field dicts as `fields`, split when they are collected so
+        # SQL generation needn't partition the list.
+        self.existing_fields: List[Dict[str, Any]] = []
+        self.new_fields: List[Dict[str, Any]] = []
         self.current_state: str = WorkflowState.IDLE
         self.pending_field_id: Optional[str] = None
         self.pending_display_type: Optional[str] = None
         self.pending_validation_type: Optional[str] = None
+        # Unknown field IDs from a pasted list, confirmed one at a time.
+        self.queued_field_ids: List[str] = []
 
     def get_summary(self) -> str:
         """Get human-readable summary of collected data"""
@@ -64,20 +197,19 @@ class WorkflowMemory:
                 summary.append(f"    - {field['field_id']} ({status})")
         return "\n".join(summary)
 
-class MCPAIAssistant:
-    def __init__(self, model_name: str = "mistral-sql-3k:latest"):
-        self.llm = ChatOllama(model=model_name, temperature=0.7)
-        self.session: Optional[ClientSession] = None
-        self.tools: List[Tool] = []
-        self.conversation_history = []
-        self.exit_stack = AsyncExitStack()
-        self.mcp_url = "http://localhost:8000/sse"
+class MCPAIAssistant(MCPAssistantBase):
+    def __init__(self, model_name: str = MODEL_NAME):
+        super().__init__(model_name)
+        # Only the last _HISTORY_MESSAGES messages are ever sent to the LLM, so
+        # older ones are dropped on append.
+        self.conversation_history: Deque[BaseMessage] = deque(maxlen=_HISTORY_MESSAGES)
         self.memory = WorkflowMemory()
         self.allowed_tools = {
             "get_organization_by_name",
             "get_process_by_name",
             "get_events_for_process",
             "check_field_exists",
+            "check_fields_exist_batch",
             "generate_page_url",
             "generate_form_page_sql",
             "validate_workflow_data",
@@ -86,89 +218,80 @@ class MCPAIAssistant:
             "get_max_process_id", 
         }
 
-    async def initialize(self):
-        """Initialize MCP connection via SSE"""
-        try:
-            streams = await self.exit_stack.enter_async_context(
-                sse_client(url=self.mcp_url)
-            )
-            self.session = await self.exit_stack.enter_async_context(
-                ClientSession(*streams)
-            )
-            await self.session.initialize()
-            tools_response = await self.session.list_tools()
-            all_server_tools = tools_response.tools
-            self.tools = [
-                tool for tool in all_server_tools
-                if tool.name in self.allowed_tools
-            ]
-            print(f" Connected to MCP server with {len(self.tools)} tools")
-        except Exception as e:
-            print(f" Failed to connect to MCP server: {e}")
-            raise
-
     def reset(self):
         """Reset conversation state and memory - NEW METHOD"""
         self.memory = WorkflowMemory()
-        self.conversation_history = []
+        self.conversation_history.clear()
         print(" Assistant state reset - starting fresh conversation")
         
+    # state -> (next_action, required_tool, prompt_instruction)
+    _STATE_TABLE: Dict[str, Tuple[str, Optional[str], str]] = {
+        WorkflowState.IDLE: (
+            "detect_intent", None,
+            "Greet user or ask if they want to create a form page"
+        ),
+        WorkflowState.ORG_NEEDED: (
+            "get_organization", "get_organization_by_name",
+            "Ask for organization legal name"
+        ),
+        WorkflowState.PROCESS_NEEDED: (
+            "get_process", "get_process_by_name",
+            "Ask for process name. MUST check if process exists in database."
+        ),
+        WorkflowState.PROCESS_CREATION_CONFIRM: (
+            "confirm_process_creation", None,
+            "Ask if user wants to create new process"
+        ),
+        WorkflowState.EVENT_NEEDED: (
+            "get_events", "get_events_for_process",
+            "Get next available event ID for the process"
+        ),
+        WorkflowState.PAGE_TITLE_NEEDED: (
+            "get_page_title", "generate_page_url",
+            "Ask for page title"
+        ),
+        WorkflowState.FIELDS_NEEDED: (
+            "collect_fields", "check_field_exists",
+            "Ask for field IDs. User can say 'done' when finished."
+        ),
+        WorkflowState.FIELD_CREATION_CONFIRM: (
+            "confirm_field_creation", None,
+            "Ask if user wants to create new field"
+        ),
+        WorkflowState.FIELD_DISPLAY_TYPE: (
+            "get_display_type", None,
+            "Ask for display type (label/checkbox/radio/textarea/select/date)"
+        ),
+        WorkflowState.FIELD_VALIDATION_TYPE: (
+            "get_validation_type", None,
+            "Ask for validation type (E/N/M/NM/A/AN)"
+        ),
+        WorkflowState.SQL_GENERATION: (
+            "generate_sql", "generate_form_page_sql",
+            "Generate SQL statements"
+        ),
+    }
+    _NO_STATE_CONTEXT = (None, None, None)
+
     def _get_state_context(self) -> Dict[str, Any]:
         """Get context for current state to guide LLM"""
         state = self.memory.current_state
-        context = {
+        next_action, required_tool, prompt_instruction = self._STATE_TABLE.get(state, self._NO_STATE_CONTEXT)
+        return {
             "current_state": state,
-            "memory": self.memory.__dict__,
-            "next_action": None,
-            "required_tool": None,
-            "prompt_instruction": None
+            "memory": self.memory,
+            "next_action": next_action,
+            "required_tool": required_tool,
+            "prompt_instruction": prompt_instruction
         }
 
-        if state == WorkflowState.IDLE:
-            context["next_action"] = "detect_intent"
-            context["prompt_instruction"] = "Greet user or ask if they want to create a form page"
-        elif state == WorkflowState.ORG_NEEDED:
-            context["next_action"] = "get_organization"
-            context["required_tool"] = "get_organization_by_name"
-            context["prompt_instruction"] = "Ask for organization legal name"
-        elif state == WorkflowState.PROCESS_NEEDED:
-            context["next_action"] = "get_process"
-            context["required_tool"] = "get_process_by_name"
-            context["prompt_instruction"] = "Ask for process name. MUST check if process exists in database."
-        elif state == WorkflowState.PROCESS_CREATION_CONFIRM:
-            context["next_action"] = "confirm_process_creation"
-            context["prompt_instruction"] = "Ask if user wants to create new process"
-        elif state == WorkflowState.EVENT_NEEDED:
-            context["next_action"] = "get_events"
-            context["required_tool"] = "get_events_for_process"
-            context["prompt_instruction"] = "Get next available event ID for the process"
-        elif state == WorkflowState.PAGE_TITLE_NEEDED:
-            context["next_action"] = "get_page_title"
-            context["required_tool"] = "generate_page_url"
-            context["prompt_instruction"] = "Ask for page title"
-        elif state == WorkflowState.FIELDS_NEEDED:
-            context["next_action"] = "collect_fields"
-            context["required_tool"] = "check_field_exists"
-            context["prompt_instruction"] = "Ask for field IDs. User can say 'done' when finished."
-        elif state == WorkflowState.FIELD_CREATION_CONFIRM:  
-            context["next_action"] = "confirm_field_creation"
-            context["prompt_instruction"] = "Ask if user wants to create new field"
-        elif state == WorkflowState.FIELD_DISPLAY_TYPE:  
-            context["next_action"] = "get_display_type"
-            context["prompt_instruction"] = "Ask for display type (label/checkbox/radio/textarea/select/date)"
-        elif state == WorkflowState.FIELD_VALIDATION_TYPE:  
-            context["next_action"] = "get_validation_type"
-            context["prompt_instruction"] = "Ask for validation type (E/N/M/NM/A/AN)"
-        elif state == WorkflowState.SQL_GENERATION:
-            context["next_action"] = "generate_sql"
-            context["required_tool"] = "generate_form_page_sql"
-            context["prompt_instruction"] = "Generate SQL statements"
-
-        return context
-
     async def _execute_state_logic(self, user_input: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """Execute state machine logic and return results"""
         state = self.memory.current_state
+        # Normalize once per turn; handlers get the stripped input plus its
+        # lowercased form and never re-normalize.
+        ui = user_input.strip()
+        ui_lower = ui.lower()
         result = {
             "state_changed": False,
             "tool_called": False,
@@ -178,394 +301,573 @@ class MCPAIAssistant:
             "action_taken": None
         }
 
-        if state == WorkflowState.IDLE:
-            if any(phrase in user_input.lower() for phrase in ["create", "form", "page", "build", "yes"]):
-                self.memory.current_state = WorkflowState.ORG_NEEDED
-                result["state_changed"] = True
-                result["next_state"] = WorkflowState.ORG_NEEDED
-                result["action_taken"] = "workflow_started"
-
-        elif state == WorkflowState.ORG_NEEDED:
-            if user_input.lower() not in ["yes", "ok", "sure", "proceed", "start"]:
-                
-                tool_result = await self._call_tool("get_organization_by_name", {"legal_name": user_input})
-                result_data = json.loads(tool_result)
-                result["tool_called"] = True
-                result["tool_name"] = "get_organization_by_name"
-                result["tool_result"] = tool_result
-
-                if result_data.get("found"):
-                    self.memory.org_id = result_data.get("orgId")
-                    self.memory.org_name = result_data.get("legalName")
-                    self.memory.current_state = WorkflowState.PROCESS_NEEDED
-                    result["state_changed"] = True
-                    result["next_state"] = WorkflowState.PROCESS_NEEDED
-                    result["action_taken"] = "organization_found"
-                    print(f"[MEMORY] ✓ Stored org: {self.memory.org_name} ({self.memory.org_id})")
-                else:
-                    result["action_taken"] = "organization_not_found"
+        # Per-state logic lives in the _handle_* methods below; _HANDLERS maps
+        # each state to its handler, so dispatch is a single dict lookup.
+        handler = self._HANDLERS.get(state)
+        if handler is not None:
+            await handler(self, ui, ui_lower, result)
 
-        elif state == WorkflowState.PROCESS_NEEDED:
-            if user_input.lower() not in ["ok", "next", "continue", "proceed"]:
-                tool_result = await self._call_tool("get_process_by_name", {
-                    "process_name": user_input,
-                    "org_id": self.memory.org_id
-                })
-                result_data = json.loads(tool_result)
-                result["tool_called"] = True
-                result["tool_name"] = "get_process_by_name"
-                result["tool_result"] = tool_result
-
-                if result_data.get("found"):
-
-                    self.memory.process_id = int(result_data.get("processId"))
-                    self.memory.process_name = result_data.get("processName")
-                    self.memory.is_new_process = False
-                    self.memory.current_state = WorkflowState.EVENT_NEEDED
-                    result["state_changed"] = True
-                    result["next_state"] = WorkflowState.EVENT_NEEDED
-                    result["action_taken"] = "process_found"
-                    print(f"[MEMORY]  Stored process: {self.memory.process_name} (ID: {self.memory.process_id})")
-                else:
-                    max_id_tool = await self._call_tool("get_max_process_id", {})
-                    max_id_data = json.loads(max_id_tool)
-                    
-                    if max_id_data.get("success"):
-                        suggested_id = max_id_data.get("suggested_next_id", 1)
-                    else:
-                        suggested_id = 1
-                    
-                    # Store for confirmation
-                    self.memory.process_name = user_input
-                    self.memory.suggested_process_id = suggested_id
-                    
-                    # Move to confirmation state
-                    self.memory.current_state = WorkflowState.PROCESS_CREATION_CONFIRM
-                    result["state_changed"] = True
-                    result["next_state"] = WorkflowState.PROCESS_CREATION_CONFIRM
-                    result["action_taken"] = "process_not_found_ask_create"
-                    result["suggested_process_id"] = suggested_id
-                    result["process_name"] = user_input
-                    print(f"[MEMORY] Process '{user_input}' not found. Suggesting ID: {suggested_id}")
-            else:
-                result["action_taken"] = "ask_for_process_name"
+        return result
 
-        elif state == WorkflowState.PROCESS_CREATION_CONFIRM:
-            user_lower = user_input.lower().strip()
-            
-            if any(word in user_lower for word in ["yes", "y", "create", "ok", "sure", "proceed"]):
-                self.memory.is_new_process = True
-                self.memory.process_id = self.memory.suggested_process_id
-                self.memory.event_id = self.memory.process_id
-                self.memory.page_id = self.memory.process_id
-                
-                self.memory.current_state = WorkflowState.PAGE_TITLE_NEEDED
-                result["state_changed"] = True
-                result["next_state"] = WorkflowState.PAGE_TITLE_NEEDED
-                result["action_taken"] = "new_process_confirmed"
-                result["process_id"] = self.memory.process_id
-                result["process_name"] = self.memory.process_name
-                print(f"[MEMORY] ✓ New process confirmed: '{self.memory.process_name}' (ID: {self.memory.process_id})")
-            
-            elif any(word in user_lower for word in ["no", "n", "wrong", "cancel", "retry"]):
-                self.memory.process_name = None
-                self.memory.suggested_process_id = None
-                
+    async def _handle_idle(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Start the workflow when the user asks for a form page"""
+        if _IDLE_TRIGGERS.search(ui_lower):
+            self.memory.current_state = WorkflowState.ORG_NEEDED
+            result["state_changed"] = True
+            result["next_state"] = WorkflowState.ORG_NEEDED
+            result["action_taken"] = "workflow_started"
+
+    async def _handle_org_needed(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Look up the organization by legal name"""
+        if ui_lower not in _START_WORDS:
+
+            tool_result = await self._call_tool("get_organization_by_name", {"legal_name": user_input})
+            result_data = orjson.loads(tool_result)
+            result["tool_called"] = True
+            result["tool_name"] = "get_organization_by_name"
+            result["tool_result"] = tool_result
+            result["tool_result_parsed"] = result_data
+
+            if result_data.get("found"):
+                self.memory.org_id = result_data.get("orgId")
+                self.memory.org_name = result_data.get("legalName")
                 self.memory.current_state = WorkflowState.PROCESS_NEEDED
                 result["state_changed"] = True
                 result["next_state"] = WorkflowState.PROCESS_NEEDED
-                result["action_taken"] = "process_name_retry"
-                print(f"[MEMORY] Process name was wrong, asking again")
+                result["action_taken"] = "organization_found"
+                print(f"[MEMORY] ✓ Stored org: {self.memory.org_name} ({self.memory.org_id})")
             else:
-                
-                result["action_taken"] = "unclear_process_response"
-
-        elif state == WorkflowState.EVENT_NEEDED:
-            if not self.memory.is_new_process:
-                tool_result = await self._call_tool("get_events_for_process", {
-                    "process_id": self.memory.process_id,
+                result["action_taken"] = "organization_not_found"
+        else:
+            result["action_taken"] = "ask_for_org_name"
+
+    async def _handle_process_needed(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Look up the process, or offer to create it if missing"""
+        if ui_lower not in _SKIP_WORDS:
+            # get_max_process_id is read-only and only needed on a miss, but
+            # running it alongside the lookup saves a round-trip when it is.
+            tool_result, max_id_tool = await asyncio.gather(
+                self._call_tool("get_process_by_name", {
+                    "process_name": user_input,
                     "org_id": self.memory.org_id
-                })
-                result_data = json.loads(tool_result)
-                result["tool_called"] = True
-                result["tool_name"] = "get_events_for_process"
-                result["tool_result"] = tool_result
-
-                if result_data.get("success"):
-                    self.memory.event_id = result_data.get("suggestedNextEventId")
-                    self.memory.page_id = self.memory.event_id
-                    print(f"[MEMORY] ✓ Stored eventId/pageId: {self.memory.event_id}")
-            
-            self.memory.current_state = WorkflowState.PAGE_TITLE_NEEDED
-            result["state_changed"] = True
-            result["next_state"] = WorkflowState.PAGE_TITLE_NEEDED
-            result["action_taken"] = "event_id_retrieved"
-
-        elif state == WorkflowState.PAGE_TITLE_NEEDED:
-            if user_input.lower() not in ["ok", "next", "continue", "proceed"]:
-                tool_result = await self._call_tool("generate_page_url", {"page_title": user_input})
-                result_data = json.loads(tool_result)
-                result["tool_called"] = True
-                result["tool_name"] = "generate_page_url"
-                result["tool_result"] = tool_result
-
-                if result_data.get("success"):
-                    self.memory.page_title = result_data.get("pageTitle")
-                    self.memory.page_url = result_data.get("pageURL")
-                    self.memory.current_state = WorkflowState.FIELDS_NEEDED
-                    result["state_changed"] = True
-                    result["next_state"] = WorkflowState.FIELDS_NEEDED
-                    result["action_taken"] = "page_title_set"
-                    print(f"[MEMORY] ✓ Stored page: {self.memory.page_title} -> {self.memory.page_url}")
-            else:
-                result["action_taken"] = "ask_for_page_title"
+                }),
+                self._call_tool("get_max_process_id", {}),
+            )
+            result_data = orjson.loads(tool_result)
+            result["tool_called"] = True
+            result["tool_name"] = "get_process_by_name"
+            result["tool_result"] = tool_result
+            result["tool_result_parsed"] = result_data
 
-        elif state == WorkflowState.FIELDS_NEEDED:
-            if user_input.lower() in ["done", "finish", "complete", "no more fields"]:
-                if len(self.memory.fields) == 0:
-                    result["action_taken"] = "no_fields_added"
-                else:
-                    self.memory.current_state = WorkflowState.SQL_GENERATION
-                    result["state_changed"] = True
-                    result["next_state"] = WorkflowState.SQL_GENERATION
-                    result["action_taken"] = "fields_complete"
-                    result["field_count"] = len(self.memory.fields)
-            elif user_input.lower() in ["ok", "next", "continue", "proceed"]:
-                result["action_taken"] = "ask_for_fields"
+            if result_data.get("found"):
+
+                self.memory.process_id = int(result_data.get("processId"))
+                self.memory.process_name = result_data.get("processName")
+                self.memory.is_new_process = False
+                self.memory.current_state = WorkflowState.EVENT_NEEDED
+                result["state_changed"] = True
+                result["next_state"] = WorkflowState.EVENT_NEEDED
+                result["action_taken"] = "process_found"
+                print(f"[MEMORY]  Stored process: {self.memory.process_name} (ID: {self.memory.process_id})")
+                # EVENT_NEEDED needs nothing from the user, so reserve the
+                # event/page ID in this same turn.
+                await self._handle_event_needed(user_input, ui_lower, result)
+                if self.memory.current_state == WorkflowState.PAGE_TITLE_NEEDED:
+                    result["action_taken"] = "process_and_event_ready"
             else:
-                tool_result = await self._call_tool("check_field_exists", {"field_id": user_input})
-                result_data = json.loads(tool_result)
-                result["tool_called"] = True
-                result["tool_name"] = "check_field_exists"
-                result["tool_result"] = tool_result
-
-                if result_data.get("found"):
-                    self.memory.fields.append({
-                        "field_id": result_data.get("fieldId"),
-                        "existing": True,
-                        "display_type": result_data.get("displayType"),
-                        "validation_type": result_data.get("validationType")
-                    })
-                    result["action_taken"] = "field_added_existing"
-                    result["field_count"] = len(self.memory.fields)
-                    result["field_id"] = result_data.get("fieldId")
-                    print(f"[MEMORY] ✓ Added existing field: {result_data.get('fieldId')}")
+                max_id_data = orjson.loads(max_id_tool)
+
+                if max_id_data.get("success"):
+                    suggested_id = max_id_data.get("suggested_next_id", 1)
                 else:
-                    self.memory.pending_field_id = user_input
-                    
-                    self.memory.current_state = WorkflowState.FIELD_CREATION_CONFIRM
-                    result["state_changed"] = True
-                    result["next_state"] = WorkflowState.FIELD_CREATION_CONFIRM
-                    result["action_taken"] = "field_not_found_ask_create"
-                    result["field_id"] = user_input
-                    print(f"[MEMORY] Field '{user_input}' not found. Asking to create.")
-        elif state == WorkflowState.FIELD_CREATION_CONFIRM:
-            user_lower = user_input.lower().strip()
-            
-            if any(word in user_lower for word in ["yes", "y", "create", "ok", "sure"]):
-                self.memory.current_state = WorkflowState.FIELD_DISPLAY_TYPE
+                    suggested_id = 1
+
+                # Store for confirmation
+                self.memory.process_name = user_input
+                self.memory.suggested_process_id = suggested_id
+
+                # Move to confirmation state
+                self.memory.current_state = WorkflowState.PROCESS_CREATION_CONFIRM
                 result["state_changed"] = True
-                result["next_state"] = WorkflowState.FIELD_DISPLAY_TYPE
-                result["action_taken"] = "new_field_confirmed"
-                print(f"[MEMORY] User confirmed creating field: {self.memory.pending_field_id}")
-            
-            elif any(word in user_lower for word in ["no", "n", "cancel", "skip"]):
-                self.memory.pending_field_id = None
+                result["next_state"] = WorkflowState.PROCESS_CREATION_CONFIRM
+                result["action_taken"] = "process_not_found_ask_create"
+                result["suggested_process_id"] = suggested_id
+                result["process_name"] = user_input
+                print(f"[MEMORY] Process '{user_input}' not found. Suggesting ID: {suggested_id}")
+        else:
+            result["action_taken"] = "ask_for_process_name"
+
+    async def _handle_process_creation_confirm(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Handle the yes/no for creating a new process"""
+        words = _WORD.findall(ui_lower)
+
+        if not _PROCESS_CONFIRM_YES.isdisjoint(words):
+            self.memory.is_new_process = True
+            self.memory.process_id = self.memory.suggested_process_id
+            self.memory.event_id = self.memory.process_id
+            self.memory.page_id = self.memory.process_id
+
+            self.memory.current_state = WorkflowState.PAGE_TITLE_NEEDED
+            result["state_changed"] = True
+            result["next_state"] = WorkflowState.PAGE_TITLE_NEEDED
+            result["action_taken"] = "new_process_confirmed"
+            result["process_id"] = self.memory.process_id
+            result["process_name"] = self.memory.process_name
+            print(f"[MEMORY] ✓ New process confirmed: '{self.memory.process_name}' (ID: {self.memory.process_id})")
+
+        elif not _PROCESS_CONFIRM_NO.isdisjoint(words):
+            self.memory.process_name = None
+            self.memory.suggested_process_id = None
+
+            self.memory.current_state = WorkflowState.PROCESS_NEEDED
+            result["state_changed"] = True
+            result["next_state"] = WorkflowState.PROCESS_NEEDED
+            result["action_taken"] = "process_name_retry"
+            print(f"[MEMORY] Process name was wrong, asking again")
+        else:
+
+            result["action_taken"] = "unclear_process_response"
+
+    async def _handle_event_needed(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Reserve the next event/page ID for an existing process"""
+        if not self.memory.is_new_process:
+            tool_result = await self._call_tool("get_events_for_process", {
+                "process_id": self.memory.process_id,
+                "org_id": self.memory.org_id
+            })
+            result_data = orjson.loads(tool_result)
+            result["tool_called"] = True
+            result["tool_name"] = "get_events_for_process"
+            result["tool_result"] = tool_result
+            result["tool_result_parsed"] = result_data
+
+            if result_data.get("success"):
+                self.memory.event_id = result_data.get("suggestedNextEventId")
+                self.memory.page_id = self.memory.event_id
+                print(f"[MEMORY] ✓ Stored eventId/pageId: {self.memory.event_id}")
+
+        self.memory.current_state = WorkflowState.PAGE_TITLE_NEEDED
+        result["state_changed"] = True
+        result["next_state"] = WorkflowState.PAGE_TITLE_NEEDED
+        result["action_taken"] = "event_id_retrieved"
+
+    async def _handle_page_title_needed(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Set the page title and generate its URL"""
+        if ui_lower not in _SKIP_WORDS:
+            tool_result = await self._call_tool("generate_page_url", {"page_title": user_input})
+            result_data = orjson.loads(tool_result)
+            result["tool_called"] = True
+            result["tool_name"] = "generate_page_url"
+            result["tool_result"] = tool_result
+            result["tool_result_parsed"] = result_data
+
+            if result_data.get("success"):
+                self.memory.page_title = result_data.get("pageTitle")
+                self.memory.page_url = result_data.get("pageURL")
                 self.memory.current_state = WorkflowState.FIELDS_NEEDED
                 result["state_changed"] = True
                 result["next_state"] = WorkflowState.FIELDS_NEEDED
-                result["action_taken"] = "field_creation_cancelled"
-                print(f"[MEMORY] Field creation cancelled")
+                result["action_taken"] = "page_title_set"
+                print(f"[MEMORY] ✓ Stored page: {self.memory.page_title} -> {self.memory.page_url}")
+        else:
+            result["action_taken"] = "ask_for_page_title"
+
+    async def _handle_fields_needed(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Collect field IDs until the user says done"""
+        if ui_lower in _DONE_WORDS:
+            if len(self.memory.fields) == 0:
+                result["action_taken"] = "no_fields_added"
             else:
-                result["action_taken"] = "unclear_field_response"
-
-        elif state == WorkflowState.FIELD_DISPLAY_TYPE:
-            valid_types = ["label", "checkbox", "radio", "textarea", "select", "date"]
-            user_lower = user_input.lower().strip()
-            
-            if user_lower in valid_types:
-                self.memory.pending_display_type = user_lower
-                
-                self.memory.current_state = WorkflowState.FIELD_VALIDATION_TYPE
+                self.memory.current_state = WorkflowState.SQL_GENERATION
                 result["state_changed"] = True
-                result["next_state"] = WorkflowState.FIELD_VALIDATION_TYPE
-                result["action_taken"] = "display_type_set"
-                result["display_type"] = user_lower
-                print(f"[MEMORY] Display type set: {user_lower}")
+                result["next_state"] = WorkflowState.SQL_GENERATION
+                result["action_taken"] = "fields_complete"
+                result["field_count"] = len(self.memory.fields)
+        elif ui_lower in _SKIP_WORDS:
+            result["action_taken"] = "ask_for_fields"
+        elif self._is_field_paste(user_input):
+            field_ids = [field_id for field_id in _FIELD_SEP.split(user_input) if field_id]
+            await self._add_fields_batch(field_ids, result)
+        elif user_input.lower() in self._known_field_ids():
+            result["action_taken"] = "fields_already_added"
+            result["field_count"] = len(self.memory.fields)
+            result["field_id"] = user_input
+        else:
+            tool_result = await self._call_tool("check_field_exists", {"field_id": user_input})
+            result_data = orjson.loads(tool_result)
+            result["tool_called"] = True
+            result["tool_name"] = "check_field_exists"
+            result["tool_result"] = tool_result
+            result["tool_result_parsed"] = result_data
+
+            if result_data.get("found"):
+                field = {
+                    "field_id": result_data.get("fieldId"),
+                    "display_label": _display_label(result_data.get("fieldId")),
+                    "existing": True,
+                    "display_type": result_data.get("displayType"),
+                    "validation_type": result_data.get("validationType")
+                }
+                self.memory.fields.append(field)
+                self.memory.existing_fields.append(field)
+                result["action_taken"] = "field_added_existing"
+                result["field_count"] = len(self.memory.fields)
+                result["field_id"] = result_data.get("fieldId")
+                print(f"[MEMORY] ✓ Added existing field: {result_data.get('fieldId')}")
             else:
-                result["action_taken"] = "invalid_display_type"
-                result["valid_types"] = valid_types
-
-        elif state == WorkflowState.FIELD_VALIDATION_TYPE:
-            validation_type = user_input.strip().upper()
-            self.memory.pending_validation_type = validation_type
-            self.memory.fields.append({
-                "field_id": self.memory.pending_field_id,
-                "existing": False,
-                "display_type": self.memory.pending_display_type,
-                "validation_type": self.memory.pending_validation_type
-            })
-            
-            result["field_id"] = self.memory.pending_field_id
+                self.memory.pending_field_id = user_input
+
+                self.memory.current_state = WorkflowState.FIELD_CREATION_CONFIRM
+                result["state_changed"] = True
+                result["next_state"] = WorkflowState.FIELD_CREATION_CONFIRM
+                result["action_taken"] = "field_not_found_ask_create"
+                result["field_id"] = user_input
+                print(f"[MEMORY] Field '{user_input}' not found. Asking to create.")
+
+    @staticmethod
+    def _is_field_paste(user_input: str) -> bool:
+        """True for several IDs in one message: comma-separated, or plain words"""
+        words = user_input.split()
+        return "," in user_input or (len(words) > 1 and all(_FIELD_ID.fullmatch(word) for word in words))
+
+    def _known_field_ids(self) -> Set[str]:
+        """Lowercased IDs already on the form or waiting for create confirmation"""
+        known = {field["field_id"].lower() for field in self.memory.fields}
+        known.update(field_id.lower() for field_id in self.memory.queued_field_ids)
+        if self.memory.pending_field_id:
+            known.add(self.memory.pending_field_id.lower())
+        return known
+
+    async def _add_fields_batch(self, field_ids: List[str], result: Dict[str, Any]):
+        """Check several pasted field IDs with one tool call.
+
+        Existing fields are added at once; unknown ones are queued and
+        confirmed one by one, as if they had been typed separately.
+        """
+        # Drop repeats within the paste and IDs the form already has,
+        # keeping the first occurrence in paste order.
+        seen = self._known_field_ids()
+        unique_ids = []
+        for field_id in field_ids:
+            if field_id.lower() not in seen:
+                seen.add(field_id.lower())
+                unique_ids.append(field_id)
+        if not unique_ids:
+            result["action_taken"] = "fields_already_added"
             result["field_count"] = len(self.memory.fields)
+            result["field_id"] = ", ".join(field_ids)
+            return
+        field_ids = unique_ids
+
+        tool_result = await self._call_tool("check_fields_exist_batch", {"field_ids": field_ids})
+        result_data = orjson.loads(tool_result)
+        result["tool_called"] = True
+        result["tool_name"] = "check_fields_exist_batch"
+        result["tool_result"] = tool_result
+        result["tool_result_parsed"] = result_data
+
+        checked = result_data.get("fields") or {}
+        added = []
+        for field_id in field_ids:
+            field_data = checked.get(field_id, {})
+            if field_data.get("found"):
+                field = {
+                    "field_id": field_data.get("fieldId"),
+                    "display_label": _display_label(field_data.get("fieldId")),
+                    "existing": True,
+                    "display_type": field_data.get("displayType"),
+                    "validation_type": field_data.get("validationType")
+                }
+                self.memory.fields.append(field)
+                self.memory.existing_fields.append(field)
+                added.append(field_data.get("fieldId"))
+            else:
+                self.memory.queued_field_ids.append(field_id)
+
+        result["field_count"] = len(self.memory.fields)
+        if added:
+            print(f"[MEMORY] ✓ Added existing fields: {', '.join(added)}")
+        if not self._ask_next_queued_field(result):
+            result["action_taken"] = "fields_added"
+            result["field_id"] = ", ".join(added)
+
+    def _ask_next_queued_field(self, result: Dict[str, Any]) -> bool:
+        """Ask to create the next queued unknown field; False if none is left"""
+        if not self.memory.queued_field_ids:
+            return False
+        field_id = self.memory.queued_field_ids.pop(0)
+        self.memory.pending_field_id = field_id
+
+        self.memory.current_state = WorkflowState.FIELD_CREATION_CONFIRM
+        result["state_changed"] = True
+        result["next_state"] = WorkflowState.FIELD_CREATION_CONFIRM
+        result["action_taken"] = "field_not_found_ask_create"
+        result["field_id"] = field_id
+        print(f"[MEMORY] Field '{field_id}' not found. Asking to create.")
+        return True
+
+    async def _handle_field_creation_confirm(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Handle the yes/no for creating a new field"""
+        words = _WORD.findall(ui_lower)
+
+        if not _FIELD_CONFIRM_YES.isdisjoint(words):
+            self.memory.current_state = WorkflowState.FIELD_DISPLAY_TYPE
+            result["state_changed"] = True
+            result["next_state"] = WorkflowState.FIELD_DISPLAY_TYPE
+            result["action_taken"] = "new_field_confirmed"
+            print(f"[MEMORY] User confirmed creating field: {self.memory.pending_field_id}")
+
+        elif not _FIELD_CONFIRM_NO.isdisjoint(words):
             self.memory.pending_field_id = None
-            self.memory.pending_display_type = None
-            self.memory.pending_validation_type = None
-            
             self.memory.current_state = WorkflowState.FIELDS_NEEDED
             result["state_changed"] = True
             result["next_state"] = WorkflowState.FIELDS_NEEDED
-            result["action_taken"] = "field_added_new"
-            print(f"[MEMORY] ✓ Added new field: {result['field_id']}")
-
-        elif state == WorkflowState.SQL_GENERATION:
-            existing_fields = [f for f in self.memory.fields if f.get("existing")]
-            new_fields = [f for f in self.memory.fields if not f.get("existing")]
-
-            form_data = {
-                "org_id": self.memory.org_id,
-                "org_name": self.memory.org_name,
-                "process_id": self.memory.process_id,
-                "process_name": self.memory.process_name,
-                "is_new_process": self.memory.is_new_process,  
-                "event_id": self.memory.event_id,
-                "page_id": self.memory.page_id,
-                "page_title": self.memory.page_title,
-                "page_url": self.memory.page_url,
-                "event_name": self.memory.page_title,
-                "group_id": self.memory.group_id,
-                "is_new_group": False,
-                "field_groups": [],
-                "new_fields": new_fields,  
-                "page_values": [
-                    {
-                        "field_id": field["field_id"],
-                        "group_id": self.memory.group_id,
-                        "field_group_id": self.memory.group_id,
-                        "display_label": field["field_id"].replace("_", " ").title(),
-                        "display_type": field.get("display_type", "label"),
-                        "validation_type": field.get("validation_type", "E")
-                    }
-                    for field in self.memory.fields 
-                ]
-            }
-
-            tool_result = await self._call_tool("generate_form_page_sql", {
-                "form_data_json": json.dumps(form_data)
-            })
-            result["tool_called"] = True
-            result["tool_name"] = "generate_form_page_sql"
-            result["tool_result"] = tool_result
-            result["action_taken"] = "sql_generated"
-
-            self.memory.current_state = WorkflowState.COMPLETE
+            result["action_taken"] = "field_creation_cancelled"
+            print(f"[MEMORY] Field creation cancelled")
+            self._ask_next_queued_field(result)
+        else:
+            result["action_taken"] = "unclear_field_response"
+
+    async def _handle_field_display_type(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Record the display type for the pending new field"""
+        if ui_lower in _DISPLAY_TYPE_SET:
+            self.memory.pending_display_type = ui_lower
+
+            self.memory.current_state = WorkflowState.FIELD_VALIDATION_TYPE
             result["state_changed"] = True
-            result["next_state"] = WorkflowState.COMPLETE
-
-        return result
+            result["next_state"] = WorkflowState.FIELD_VALIDATION_TYPE
+            result["action_taken"] = "display_type_set"
+            result["display_type"] = ui_lower
+            print(f"[MEMORY] Display type set: {ui_lower}")
+        else:
+            result["action_taken"] = "invalid_display_type"
+            result["valid_types"] = list(_DISPLAY_TYPES)
+
+    async def _handle_field_validation_type(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Record the validation type and add the pending new field"""
+        validation_type = user_input.upper()
+        self.memory.pending_validation_type = validation_type
+        field = {
+            "field_id": self.memory.pending_field_id,
+            "display_label": _display_label(self.memory.pending_field_id),
+            "existing": False,
+            "display_type": self.memory.pending_display_type,
+            "validation_type": self.memory.pending_validation_type
+        }
+        self.memory.fields.append(field)
+        self.memory.new_fields.append(field)
+
+        result["field_id"] = self.memory.pending_field_id
+        result["field_count"] = len(self.memory.fields)
+        self.memory.pending_field_id = None
+        self.memory.pending_display_type = None
+        self.memory.pending_validation_type = None
+
+        self.memory.current_state = WorkflowState.FIELDS_NEEDED
+        result["state_changed"] = True
+        result["next_state"] = WorkflowState.FIELDS_NEEDED
+        result["action_taken"] = "field_added_new"
+        print(f"[MEMORY] ✓ Added new field: {result['field_id']}")
+        self._ask_next_queued_field(result)
+
+    async def _handle_sql_generation(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Build form_data from memory and generate the SQL"""
+        memory = self.memory
+        group_id = memory.group_id
+        form_data = {
+            "org_id": memory.org_id,
+            "org_name": memory.org_name,
+            "process_id": memory.process_id,
+            "process_name": memory.process_name,
+            "is_new_process": memory.is_new_process,  
+            "event_id": memory.event_id,
+            "page_id": memory.page_id,
+            "page_title": memory.page_title,
+            "page_url": memory.page_url,
+            "event_name": memory.page_title,
+            "group_id": group_id,
+            "is_new_group": False,
+            "field_groups": [],
+            "new_fields": memory.new_fields,  
+            "page_values": [
+                {
+                    "field_id": field["field_id"],
+                    "group_id": group_id,
+                    "field_group_id": group_id,
+                    "display_label": field["display_label"],
+                    "display_type": field.get("display_type", "label"),
+                    "validation_type": field.get("validation_type", "E")
+                }
+                for field in memory.fields 
+            ]
+        }
 
-    async def chat(self, user_input: str) -> str:
-        """Process user input with hybrid state machine + LLM approach"""
+        tool_result = await self._call_tool("generate_form_page_sql", {
+            "form_data_json": orjson.dumps(form_data).decode()
+        })
+        result["tool_called"] = True
+        result["tool_name"] = "generate_form_page_sql"
+        result["tool_result"] = tool_result
+        result["action_taken"] = "sql_generated"
+
+        self.memory.current_state = WorkflowState.COMPLETE
+        result["state_changed"] = True
+        result["next_state"] = WorkflowState.COMPLETE
+
+    async def _handle_complete(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Point at a reset once the SQL is out; memory holds a single page"""
+        result["action_taken"] = "workflow_already_complete"
+
+    _HANDLERS = {
+        WorkflowState.IDLE: _handle_idle,
+        WorkflowState.ORG_NEEDED: _handle_org_needed,
+        WorkflowState.PROCESS_NEEDED: _handle_process_needed,
+        WorkflowState.PROCESS_CREATION_CONFIRM: _handle_process_creation_confirm,
+        WorkflowState.EVENT_NEEDED: _handle_event_needed,
+        WorkflowState.PAGE_TITLE_NEEDED: _handle_page_title_needed,
+        WorkflowState.FIELDS_NEEDED: _handle_fields_needed,
+        WorkflowState.FIELD_CREATION_CONFIRM: _handle_field_creation_confirm,
+        WorkflowState.FIELD_DISPLAY_TYPE: _handle_field_display_type,
+        WorkflowState.FIELD_VALIDATION_TYPE: _handle_field_validation_type,
+        WorkflowState.SQL_GENERATION: _handle_sql_generation,
+        WorkflowState.COMPLETE: _handle_complete,
+    }
+
+    async def _prepare_turn(self, user_input: str) -> Tuple[Optional[str], List[BaseMessage]]:
+        """Run the state machine for one turn.
+
+        Returns (reply, []) when the turn is answered without the LLM,
+        otherwise (None, messages) with the prompt to send to the LLM.
+        """
         if not self.session:
             await self.initialize()
 
-        if user_input.lower() in ["show memory", "show state", "status"]:
-            return self.memory.get_summary()
+        ui_lower = user_input.strip().lower()
+        command = _COMMANDS.get(ui_lower)
+        if command:
+            return command(self), []
         
-        if "process" in user_input.lower() and "id" in user_input.lower() and self.memory.process_id:
-            return f"The process ID for '{self.memory.process_name}' is: {self.memory.process_id}"
-
-        try:
-            context = self._get_state_context()
-            
-            state_result = await self._execute_state_logic(user_input, context)
-            
-            action_taken = state_result.get('action_taken')
-            if action_taken == "sql_generated":
-                tool_result = state_result.get('tool_result')
-                if tool_result:
-                    return tool_result
-                else:
-                    return "Error: SQL generation failed - no result returned"
-            
-            field_id = state_result.get('field_id', 'unknown')
-            field_count = len(self.memory.fields)
-            
-            system_prompt = f"""You are a helpful assistant for form page creation.
+        if self.memory.process_id and _PROCESS_ID_Q.search(ui_lower):
+            return f"The process ID for '{self.memory.process_name}' is: {self.memory.process_id}", []
 
-CURRENT STATE: {context['current_state']}
-ACTION TAKEN: {action_taken}
+        context = self._get_state_context()
+        
+        state_result = await self._execute_state_logic(user_input, context)
+        
+        action_taken = state_result.get('action_taken')
+        if action_taken == "sql_generated":
+            tool_result = state_result.get('tool_result')
+            if tool_result:
+                return tool_result, []
+            else:
+                return "Error: SQL generation failed - no result returned", []
 
-CRITICAL RESPONSE RULES:
-- If action_taken is "workflow_started", respond: "Great! Which organization is this form page for? (Provide the legal name)"
-- If action_taken is "organization_found", respond: "Found [orgName] (ID: [orgId]). Which process should this form page belong to?"
-- If action_taken is "ask_for_process_name", respond: "Which process should this form page belong to? (Provide the process name)"
-- If action_taken is "process_found", respond: "Found process '[processName]' (ID: [processId]). Moving to next step..."
-- If action_taken is "process_not_found_ask_create", respond: "Process '[process_name]' does not exist in the database. Do you want to create a new process with ID [suggested_process_id]? (yes/no)"
-- If action_taken is "new_process_confirmed", respond: "Perfect! New process '[process_name]' will be created with ID [process_id]. Event ID [process_id] and Page ID [process_id] will be used. What should the page title be?"
-- If action_taken is "process_name_retry", respond: "Okay, let's try again. Which process should this form page belong to? (Provide the correct process name)"
-- If action_taken is "unclear_process_response", respond: "Please respond with 'yes' to create the new process, or 'no' if the process name was incorrect."
-- If action_taken is "event_id_retrieved", respond: "Event ID: [eventId] assigned. What should the page title be?"
-- If action_taken is "ask_for_page_title", respond: "What should the page title be? (e.g., 'Task Details')"
-- If action_taken is "page_title_set", respond: "Page '[pageTitle]' created with URL: [pageURL]. Ready to add fields. What field ID do you want to add? (or say 'done')"
-- If action_taken is "ask_for_fields", respond: "What field ID do you want to add? (Provide field ID, or say 'done' to finish)"
-- If action_taken is "field_added_existing", respond: "Field '{field_id}' added ({field_count} total). Add another field or say 'done'."
-- If action_taken is "field_not_found_ask_create", respond: "Field '{field_id}' does not exist in adminFields table. Do you want to create a new field with this fieldId? (yes/no)"
-- If action_taken is "new_field_confirmed", respond: "Great! What display type for field '{self.memory.pending_field_id}'? (label/checkbox/radio/textarea/select/date)"
-- If action_taken is "display_type_set", respond: "Display type set to '[display_type]'. What validation type? (E=Email, N=Numeric, M=Mandatory, NM=Not Mandatory, A=Alphabetic, AN=Alphanumeric)"
-- If action_taken is "field_added_new", respond: "New field '{field_id}' will be created ({field_count} total). Add another field or say 'done'."
-- If action_taken is "field_creation_cancelled", respond: "Field creation cancelled. Please provide another field ID or type 'done' to finish."
-- If action_taken is "unclear_field_response", respond: "Please respond with 'yes' to create the new field, or 'no' to skip this field."
-- If action_taken is "invalid_display_type", respond: "Invalid display type. Please choose from: label, checkbox, radio, textarea, select, date"
-- If action_taken is "no_fields_added", respond: "You haven't added any fields yet. Please add at least one field."
-- If action_taken is "fields_complete", respond: "Collected {field_count} fields. Generating SQL..."
-- If action_taken is "sql_generated", output the raw SQL from tool_result without modification
-- If action_taken is "organization_not_found", respond: "Organization not found. Please provide the exact legal name."
+        template = _RESPONSE_TEMPLATES.get(action_taken)
+        if template:
+            reply = template.format_map(self._template_values(state_result))
+            self._remember(user_input, reply)
+            return reply, []
+        
+        # The server's tool results are indented JSON; when the turn already
+        # parsed one, send it compact to keep the prompt short.
+        parsed = state_result.get('tool_result_parsed')
+        tool_result = orjson.dumps(parsed).decode() if parsed is not None else state_result.get('tool_result') or 'None'
+
+        memory = self.memory
+        turn_prompt = _TURN_PROMPT.format(
+            current_state=context['current_state'],
+            action_taken=action_taken,
+            tool_result=tool_result,
+            field_id=state_result.get('field_id', 'unknown'),
+            field_count=len(memory.fields),
+            process_name=memory.process_name or 'not set',
+            suggested_process_id=state_result.get('suggested_process_id', 'N/A'),
+            process_id=state_result.get('process_id', memory.process_id or 'N/A'),
+            display_type=state_result.get('display_type', 'N/A'),
+            pending_field_id=memory.pending_field_id or 'N/A',
+        )
+
+        messages = [
+            _SYSTEM_PROMPT_RULES,
+            SystemMessage(content=turn_prompt),
+            *self.conversation_history,
+            HumanMessage(content=user_input)
+        ]
+        return None, messages
+
+    def _template_values(self, state_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Values available to _RESPONSE_TEMPLATES for the current turn"""
+        memory = self.memory
+        return {
+            "org_id": memory.org_id,
+            "org_name": memory.org_name,
+            "process_id": state_result.get("process_id", memory.process_id),
+            "process_name": memory.process_name,
+            "suggested_process_id": state_result.get("suggested_process_id", memory.suggested_process_id),
+            "event_id": memory.event_id,
+            "page_title": memory.page_title,
+            "page_url": memory.page_url,
+            "field_id": state_result.get("field_id", "unknown"),
+            "field_count": len(memory.fields),
+            "pending_field_id": memory.pending_field_id,
+            "display_type": state_result.get("display_type", "N/A"),
+        }
 
-TOOL RESULT:
-{json.dumps(state_result.get('tool_result'), indent=2) if state_result.get('tool_result') else 'None'}
+    def _remember(self, user_input: str, response_text: str):
+        """Append a completed turn to the conversation history"""
+        self.conversation_history.append(HumanMessage(content=user_input))
+        self.conversation_history.append(AIMessage(content=response_text))
 
-Additional context:
-- field_id: {field_id}
-- field_count: {field_count}
-- process_name: {self.memory.process_name if self.memory.process_name else 'not set'}
-- suggested_process_id: {state_result.get('suggested_process_id', 'N/A')}
-- process_id: {state_result.get('process_id', self.memory.process_id if self.memory.process_id else 'N/A')}
-- display_type: {state_result.get('display_type', 'N/A')}
-- pending_field_id: {self.memory.pending_field_id if self.memory.pending_field_id else 'N/A'}
-
-Extract exact values from tool_result and provide clear response."""
-
-            messages = [
-                SystemMessage(content=system_prompt),
-                *self.conversation_history[-4:],
-                HumanMessage(content=user_input)
-            ]
-            
-            response = await self.llm.ainvoke(messages)
-            response_text = response.content
-            
-            self.conversation_history.append(HumanMessage(content=user_input))
-            self.conversation_history.append(AIMessage(content=response_text))
+    async def chat(self, user_input: str) -> str:
+        """Process user input with hybrid state machine + LLM approach"""
+        try:
+            reply, messages = await self._prepare_turn(user_input)
+            if reply is not None:
+                return reply
             
+            cache_key = ReplyCache.key(self.llm, messages)
+            response_text = await ReplyCache.get(cache_key) if cache_key else None
+            if response_text is None:
+                response = await self.llm.ainvoke(messages)
+                response_text = response.content
+                if cache_key:
+                    await ReplyCache.set(cache_key, response_text)
+            self._remember(user_input, response_text)
             return response_text
             
         except Exception as e:
             return f"Error: {str(e)}"
 
-    async def _call_tool(self, tool_name: str, arguments: dict) -> str:
-        """Call MCP tool directly"""
+    async def chat_stream(self, user_input: str) -> AsyncIterator[str]:
+        """Like chat(), but yields the LLM reply token by token as it is generated"""
         try:
-            result = await self.session.call_tool(tool_name, arguments)
-            if result.content:
-                return result.content[0].text
-            return json.dumps({"success": False, "error": "No result"})
-        except Exception as e:
-            return json.dumps({"success": False, "error": str(e)})
+            reply, messages = await self._prepare_turn(user_input)
+            if reply is not None:
+                yield reply
+                return
+
+            cache_key = ReplyCache.key(self.llm, messages)
+            cached = await ReplyCache.get(cache_key) if cache_key else None
+            if cached is not None:
+                self._remember(user_input, cached)
+                yield cached
+                return
+
+            chunks = []
+            async for chunk in self.llm.astream(messages):
+                # Ollama's last chunk carries only metadata; don't emit it
+                # as an empty delta.
+                if not chunk.content:
+                    continue
+                chunks.append(chunk.content)
+                yield chunk.content
+            response_text = "".join(chunks)
+            self._remember(user_input, response_text)
+            if cache_key:
+                await ReplyCache.set(cache_key, response_text)
 
-    async def close(self):
-        """Close MCP connection"""
-        await self.exit_stack.aclose()
+        except Exception as e:
+            yield f"Error: {str(e)}"
 
 async def main():    
     assistant = MCPAIAssistant()
@@ -580,11 +882,21 @@ async def main():
             if not user_input.strip():
                 continue
             
-            response = await assistant.chat(user_input)
-            print(f"\n Assistant: {response}\n")
-            print(f"[State: {assistant.memory.current_state}]\n")
+            # Print the reply as it is generated rather than after the
+            # whole LLM response is in.
+            print("\n Assistant: ", end="", flush=True)
+            async for piece in assistant.chat_stream(user_input):
+                print(piece, end="", flush=True)
+            # End of reply and current state in one write.
+            print(f"\n\n[State: {assistant.memory.current_state}]\n")
     finally:
         await assistant.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Same loop as the API server; req.txt skips uvloop on Windows.
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
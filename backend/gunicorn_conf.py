@@ -0,0 +1,36 @@
+# gunicorn_conf.py - Production prefork config for the API server
+#
+#   gunicorn -c gunicorn_conf.py api_server:app
+#   gunicorn -c gunicorn_conf.py apiserverreset:app
+#
+# `uvicorn.run` in the server modules stays the dev entrypoint.
+
+import multiprocessing
+import os
+
+# UDS_PATH (same knob as the uvicorn launcher) binds a Unix socket for a
+# co-located frontend/proxy instead of TCP. There, and behind any TCP proxy,
+# every request comes from the proxy: the opt-in CHAT_RATE_PER_SEC limit keys
+# on X-Forwarded-For from the hosts in FORWARDED_ALLOW_IPS (which gunicorn
+# also reads), so set it to the proxy's address when enabling the limit.
+bind = f"unix:{os.environ['UDS_PATH']}" if os.getenv("UDS_PATH") else os.getenv("GUNICORN_BIND", "0.0.0.0:8001")
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Same knob as the uvicorn launcher. Each worker runs lifespan after fork and
+# gets its own assistant (and conversation memory), so the default is one
+# worker; UVICORN_WORKERS=auto gives 2 * cores + 1. With more than one worker
+# a user's turns are spread across workers that each hold a different
+# WorkflowMemory, so the workflow state jumps between them; only raise it
+# behind a sticky-session proxy.
+_workers = os.getenv("UVICORN_WORKERS", "1")
+workers = 2 * multiprocessing.cpu_count() + 1 if _workers == "auto" else max(1, int(_workers))
+
+# Import the app (route table, pydantic models) once in the master so workers
+# share those pages copy-on-write.
+preload_app = True
+
+# No max_requests: the worker holds the only assistant and its in-memory
+# WorkflowMemory, so recycling it would wipe in-progress workflows mid-conversation.
+
+# LLM generations can take well over gunicorn's 30s default.
+timeout = 120
@@ -1,12 +1,100 @@
 import asyncio
-import json
+import orjson
 import re
-from typing import Optional, List, Dict, Any
-from contextlib import AsyncExitStack
-from mcp import ClientSession, Tool
-from mcp.client.sse import sse_client
-from langchain_ollama import ChatOllama
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from collections import deque
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable, Deque, Set, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from clientcommon import MCPAssistantBase, MODEL_NAME, ReplyCache
+
+# Keyword sets for the state machine, built once instead of as list literals
+# on every turn.
+_IDLE_TRIGGERS = re.compile(r"\b(?:create|form|page|build|yes)")
+_START_WORDS = frozenset({"yes", "ok", "sure", "proceed", "start"})
+_SKIP_WORDS = frozenset({"ok", "next", "continue", "proceed"})
+_DONE_WORDS = frozenset({"done", "finish", "complete", "no more fields"})
+# Commands answered straight from memory, keyed by the lowercased input.
+_COMMANDS: Dict[str, Callable[["MCPAIAssistant"], str]] = {
+    "show memory": lambda assistant: assistant.memory.get_summary(),
+    "show state": lambda assistant: assistant.memory.get_summary(),
+    "status": lambda assistant: assistant.memory.get_summary(),
+}
+# Matched against the lowercased input.
+_PROCESS_ID_Q = re.compile(r"\bprocess\b.*\bid\b|\bid\b.*\bprocess\b")
+# Separators when several field IDs are pasted into one message.
+_FIELD_SEP = re.compile(r"[,\s]+")
+# Without a comma, a multi-word message is only a paste if every word is one.
+_FIELD_ID = re.compile(r"\w+")
+
+# Replies for actions whose wording is fixed by the CRITICAL RESPONSE RULES
+# below. They only need values the state machine already holds, so they
+# are formatted directly instead of asking the LLM to copy them out.
+_RESPONSE_TEMPLATES: Dict[str, str] = {
+    "workflow_started": "Great! Which organization is this form page for? (Provide the legal name)",
+    "organization_found": "Found {org_name} (ID: {org_id}). Which process should this form page belong to?",
+    "organization_not_found": "Organization not found. Please provide the exact legal name.",
+    "ask_for_org_name": "Which organization is this form page for? (Provide the legal name)",
+    "ask_for_process_name": "Which process should this form page belong to? (Provide the process name)",
+    "process_found": "Found process '{process_name}' (ID: {process_id}). Moving to next step...",
+    "process_not_found": "Process not found. Please check the process name.",
+    "event_id_retrieved": "Event ID: {event_id} assigned. What should the page title be?",
+    "process_and_event_ready": "Found process '{process_name}' (ID: {process_id}). Event ID: {event_id} assigned. What should the page title be?",
+    "ask_for_page_title": "What should the page title be? (e.g., 'Task Details')",
+    "page_title_set": "Page '{page_title}' created with URL: {page_url}. Ready to add fields. What field ID do you want to add? (or say 'done')",
+    "ask_for_fields": "What field ID do you want to add? (Provide field ID, or say 'done' to finish)",
+    "field_added_existing": "Field '{field_id}' added ({field_count} total). Add another field or say 'done'.",
+    "field_added_new": "New field '{field_id}' will be created ({field_count} total). Add another field or say 'done'.",
+    "no_fields_added": "You haven't added any fields yet. Please add at least one field.",
+    "fields_added": "Fields {field_id} added ({field_count} total). Add another field or say 'done'.",
+    "fields_already_added": "Already added: {field_id} ({field_count} total). Add another field or say 'done'.",
+    "fields_complete": "Collected {field_count} fields. Generating SQL...",
+    "workflow_already_complete": "The SQL for page '{page_title}' has already been generated. Reset the conversation to create another form page.",
+}
+
+# The unchanging part of the system prompt, built once. It goes first so the
+# model server can reuse its prefix cache across turns; the per-turn state
+# and tool result follow in a second system message.
+_SYSTEM_PROMPT_RULES = SystemMessage(content="""You are a helpful assistant for form page creation.
+
+CRITICAL RESPONSE RULES:
+- If action_taken is "workflow_started", respond: "Great! Which organization is this form page for? (Provide the legal name)"
+- If action_taken is "organization_found", respond: "Found [orgName] (ID: [orgId]). Which process should this form page belong to?"
+- If action_taken is "ask_for_process_name", respond: "Which process should this form page belong to? (Provide the process name)"
+- If action_taken is "process_found", respond: "Found process '[processName]' (ID: [processId]). Moving to next step..."
+- If action_taken is "event_id_retrieved", respond: "Event ID: [eventId] assigned. What should the page title be?"
+- If action_taken is "ask_for_page_title", respond: "What should the page title be? (e.g., 'Task Details')"
+- If action_taken is "page_title_set", respond: "Page '[pageTitle]' created with URL: [pageURL]. Ready to add fields. What field ID do you want to add? (or say 'done')"
+- If action_taken is "ask_for_fields", respond: "What field ID do you want to add? (Provide field ID, or say 'done' to finish)"
+- If action_taken is "field_added_existing", respond: "Field '[field_id]' added ([field_count] total). Add another field or say 'done'."
+- If action_taken is "field_added_new", respond: "New field '[field_id]' will be created ([field_count] total). Add another field or say 'done'."
+- If action_taken is "no_fields_added", respond: "You haven't added any fields yet. Please add at least one field."
+- If action_taken is "fields_complete", respond: "Collected [field_count] fields. Generating SQL..."
+- If action_taken is "sql_generated", output the raw SQL from tool_result without modification
+- If action_taken is "organization_not_found", respond: "Organization not found. Please provide the exact legal name."
+- If action_taken is "ask_for_org_name", respond: "Which organization is this form page for? (Provide the legal name)"
+- If action_taken is "process_not_found", respond: "Process not found. Please check the process name."
+
+Extract exact values from tool_result and the context below and provide clear response.""")
+
+# Per-turn context sent after _SYSTEM_PROMPT_RULES on the LLM fallback path.
+_TURN_PROMPT = """CURRENT STATE: {current_state}
+ACTION TAKEN: {action_taken}
+
+TOOL RESULT:
+{tool_result}
+
+Additional context:
+- field_id: {field_id}
+- field_count: {field_count}"""
+
+# Prior messages (two per turn) included in the LLM prompt.
+_HISTORY_MESSAGES = 4
+
+def _display_label(field_id: str) -> str:
+    """Label shown for a field on the page, e.g. "phone_number" -> "Phone Number"
+
+    Computed once when the field is collected, not on every SQL build.
+    """
+    return field_id.replace("_", " ").title()
 
 class WorkflowState:
     """Enum-like class for workflow states"""
@@ -21,6 +109,12 @@ class WorkflowState:
 
 class WorkflowMemory:
     """Structured memory for form page creation workflow"""
+    __slots__ = (
+        "org_id", "org_name", "process_id", "process_name", "is_new_process",
+        "event_id", "page_id", "page_title", "page_url", "group_id", "fields",
+        "existing_fields", "new_fields", "current_state",
+    )
+
     def __init__(self):
         self.org_id: Optional[str] = None
         self.org_name: Optional[str] = None
@@ -33,6 +127,10 @@ class WorkflowMemory:
         self.page_url: Optional[str] = None
         self.group_id: int = 1
         self.fields: List[Dict[str, Any]] = []
+        # The same field dicts as `fields`, split when they are collected so
+        # SQL generation needn't partition the list.
+        self.existing_fields: List[Dict[str, Any]] = []
+        self.new_fields: List[Dict[str, Any]] = []
         self.current_state: str = WorkflowState.IDLE
     
     def get_summary(self) -> str:
@@ -56,14 +154,12 @@ class WorkflowMemory:
                 summary.append(f"    - {field['field_id']} ({status})")
         return "\n".join(summary)
 
-class MCPAIAssistant:
-    def __init__(self, model_name: str = "mistral-sql-3k:latest"):
-        self.llm = ChatOllama(model=model_name, temperature=0.7)
-        self.session: Optional[ClientSession] = None
-        self.tools: List[Tool] = []
-        self.conversation_history = []
-        self.exit_stack = AsyncExitStack()
-        self.mcp_url = "http://localhost:8000/sse"
+class MCPAIAssistant(MCPAssistantBase):
+    def __init__(self, model_name: str = MODEL_NAME):
+        super().__init__(model_name)
+        # Only the last _HISTORY_MESSAGES messages are ever sent to the LLM, so
+        # older ones are dropped on append.
+        self.conversation_history: Deque[BaseMessage] = deque(maxlen=_HISTORY_MESSAGES)
         self.memory = WorkflowMemory()
 
         self.allowed_tools = {
@@ -72,6 +168,7 @@ class MCPAIAssistant:
             "debug_process_query",
             "get_events_for_process",
             "check_field_exists",
+            "check_fields_exist_batch",
             "generate_page_url",
             "generate_form_page_sql",
             "validate_workflow_data",
@@ -79,81 +176,64 @@ class MCPAIAssistant:
             "get_field_display_types",
         }
 
-    async def initialize(self):
-        """Initialize MCP connection via SSE"""
-        try:
-            streams = await self.exit_stack.enter_async_context(
-                sse_client(url=self.mcp_url)
-            )
-            self.session = await self.exit_stack.enter_async_context(
-                ClientSession(*streams)
-            )
-            await self.session.initialize()
-
-            tools_response = await self.session.list_tools()
-            all_server_tools = tools_response.tools
-            self.tools = [
-                tool for tool in all_server_tools
-                if tool.name in self.allowed_tools
-            ]
-
-            print(f" Connected to MCP server with {len(self.tools)} tools")
-
-        except Exception as e:
-            print(f" Failed to connect to MCP server: {e}")
-            raise
+    def reset(self):
+        """Reset conversation state and memory"""
+        self.memory = WorkflowMemory()
+        self.conversation_history.clear()
+        print(" Assistant state reset - starting fresh conversation")
+
+    # state -> (next_action, required_tool, prompt_instruction)
+    _STATE_TABLE: Dict[str, Tuple[str, Optional[str], str]] = {
+        WorkflowState.IDLE: (
+            "detect_intent", None,
+            "Greet user or ask if they want to create a form page"
+        ),
+        WorkflowState.ORG_NEEDED: (
+            "get_organization", "get_organization_by_name",
+            "Ask for organization legal name"
+        ),
+        WorkflowState.PROCESS_NEEDED: (
+            "get_process", "get_process_by_name",
+            "Ask for process name. MUST check if process exists in database."
+        ),
+        WorkflowState.EVENT_NEEDED: (
+            "get_events", "get_events_for_process",
+            "Get next available event ID for the process"
+        ),
+        WorkflowState.PAGE_TITLE_NEEDED: (
+            "get_page_title", "generate_page_url",
+            "Ask for page title"
+        ),
+        WorkflowState.FIELDS_NEEDED: (
+            "collect_fields", "check_field_exists",
+            "Ask for field IDs. User can say 'done' when finished."
+        ),
+        WorkflowState.SQL_GENERATION: (
+            "generate_sql", "generate_form_page_sql",
+            "Generate SQL statements"
+        ),
+    }
+    _NO_STATE_CONTEXT = (None, None, None)
 
     def _get_state_context(self) -> Dict[str, Any]:
         """Get context for current state to guide LLM"""
         state = self.memory.current_state
-        
-        context = {
+        next_action, required_tool, prompt_instruction = self._STATE_TABLE.get(state, self._NO_STATE_CONTEXT)
+        return {
             "current_state": state,
-            "memory": self.memory.__dict__,
-            "next_action": None,
-            "required_tool": None,
-            "prompt_instruction": None
+            "memory": self.memory,
+            "next_action": next_action,
+            "required_tool": required_tool,
+            "prompt_instruction": prompt_instruction
         }
-        
-        if state == WorkflowState.IDLE:
-            context["next_action"] = "detect_intent"
-            context["prompt_instruction"] = "Greet user or ask if they want to create a form page"
-        
-        elif state == WorkflowState.ORG_NEEDED:
-            context["next_action"] = "get_organization"
-            context["required_tool"] = "get_organization_by_name"
-            context["prompt_instruction"] = "Ask for organization legal name"
-        
-        elif state == WorkflowState.PROCESS_NEEDED:
-            context["next_action"] = "get_process"
-            context["required_tool"] = "get_process_by_name"
-            context["prompt_instruction"] = "Ask for process name. MUST check if process exists in database."
-        
-        elif state == WorkflowState.EVENT_NEEDED:
-            context["next_action"] = "get_events"
-            context["required_tool"] = "get_events_for_process"
-            context["prompt_instruction"] = "Get next available event ID for the process"
-        
-        elif state == WorkflowState.PAGE_TITLE_NEEDED:
-            context["next_action"] = "get_page_title"
-            context["required_tool"] = "generate_page_url"
-            context["prompt_instruction"] = "Ask for page title"
-        
-        elif state == WorkflowState.FIELDS_NEEDED:
-            context["next_action"] = "collect_fields"
-            context["required_tool"] = "check_field_exists"
-            context["prompt_instruction"] = "Ask for field IDs. User can say 'done' when finished."
-        
-        elif state == WorkflowState.SQL_GENERATION:
-            context["next_action"] = "generate_sql"
-            context["required_tool"] = "generate_form_page_sql"
-            context["prompt_instruction"] = "Generate SQL statements"
-        
-        return context
 
     async def _execute_state_logic(self, user_input: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """Execute state machine logic and return results"""
         state = self.memory.current_state
+        # Normalize once per turn; handlers get the stripped input plus its
+        # lowercased form and never re-normalize.
+        ui = user_input.strip()
+        ui_lower = ui.lower()
         result = {
             "state_changed": False,
             "tool_called": False,
@@ -163,300 +243,446 @@ class MCPAIAssistant:
             "action_taken": None
         }
         
-        # IDLE STATE
-        if state == WorkflowState.IDLE:
-            if any(phrase in user_input.lower() for phrase in ["create", "form", "page", "build", "yes"]):
-                self.memory.current_state = WorkflowState.ORG_NEEDED
+        # Per-state logic lives in the _handle_* methods below; _HANDLERS maps
+        # each state to its handler, so dispatch is a single dict lookup.
+        handler = self._HANDLERS.get(state)
+        if handler is not None:
+            await handler(self, ui, ui_lower, result)
+
+        return result
+
+    async def _handle_idle(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Start the workflow when the user asks for a form page"""
+        if _IDLE_TRIGGERS.search(ui_lower):
+            self.memory.current_state = WorkflowState.ORG_NEEDED
+            result["state_changed"] = True
+            result["next_state"] = WorkflowState.ORG_NEEDED
+            result["action_taken"] = "workflow_started"
+
+    async def _handle_org_needed(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Look up the organization by legal name"""
+        if ui_lower not in _START_WORDS:
+            # Call tool
+            tool_result = await self._call_tool("get_organization_by_name", {"legal_name": user_input})
+            result_data = orjson.loads(tool_result)
+
+            result["tool_called"] = True
+            result["tool_name"] = "get_organization_by_name"
+            result["tool_result"] = tool_result
+            result["tool_result_parsed"] = result_data
+
+            if result_data.get("found"):
+                self.memory.org_id = result_data.get("orgId")
+                self.memory.org_name = result_data.get("legalName")
+                self.memory.current_state = WorkflowState.PROCESS_NEEDED
                 result["state_changed"] = True
-                result["next_state"] = WorkflowState.ORG_NEEDED
-                result["action_taken"] = "workflow_started"
-        
-        # ORG_NEEDED STATE
-        elif state == WorkflowState.ORG_NEEDED:
-            if user_input.lower() not in ["yes", "ok", "sure", "proceed", "start"]:
-                # Call tool
-                tool_result = await self._call_tool("get_organization_by_name", {"legal_name": user_input})
-                result_data = json.loads(tool_result)
-                
-                result["tool_called"] = True
-                result["tool_name"] = "get_organization_by_name"
-                result["tool_result"] = tool_result
-                
-                if result_data.get("found"):
-                    self.memory.org_id = result_data.get("orgId")
-                    self.memory.org_name = result_data.get("legalName")
-                    self.memory.current_state = WorkflowState.PROCESS_NEEDED
-                    result["state_changed"] = True
-                    result["next_state"] = WorkflowState.PROCESS_NEEDED
-                    result["action_taken"] = "organization_found"
-                    print(f"[MEMORY] ✓ Stored org: {self.memory.org_name} ({self.memory.org_id})")
-                else:
-                    result["action_taken"] = "organization_not_found"
-        
-        # PROCESS_NEEDED STATE
-        elif state == WorkflowState.PROCESS_NEEDED:
-            if user_input.lower() not in ["ok", "next", "continue", "proceed"]:
-                # User provided a process name - look it up
-                tool_result = await self._call_tool("get_process_by_name", {
-                    "process_name": user_input,
-                    "org_id": self.memory.org_id
-                })
-                result_data = json.loads(tool_result)
-                
-                result["tool_called"] = True
-                result["tool_name"] = "get_process_by_name"
-                result["tool_result"] = tool_result
-                
-                if result_data.get("found"):
-                    self.memory.process_id = int(result_data.get("processId"))
-                    self.memory.process_name = result_data.get("processName")
-                    self.memory.is_new_process = False
-                    self.memory.current_state = WorkflowState.EVENT_NEEDED
-                    result["state_changed"] = True
-                    result["next_state"] = WorkflowState.EVENT_NEEDED
-                    result["action_taken"] = "process_found"
-                    print(f"[MEMORY] ✓ Stored process: {self.memory.process_name} (ID: {self.memory.process_id})")
-                else:
-                    result["action_taken"] = "process_not_found"
+                result["next_state"] = WorkflowState.PROCESS_NEEDED
+                result["action_taken"] = "organization_found"
+                print(f"[MEMORY] ✓ Stored org: {self.memory.org_name} ({self.memory.org_id})")
             else:
-                result["action_taken"] = "ask_for_process_name"
-        
-        # EVENT_NEEDED STATE
-        elif state == WorkflowState.EVENT_NEEDED:
-            # Always get event ID automatically
-            tool_result = await self._call_tool("get_events_for_process", {
-                "process_id": self.memory.process_id,
+                result["action_taken"] = "organization_not_found"
+        else:
+            result["action_taken"] = "ask_for_org_name"
+
+    async def _handle_process_needed(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Look up the process, or offer to create it if missing"""
+        if ui_lower not in _SKIP_WORDS:
+            # User provided a process name - look it up
+            tool_result = await self._call_tool("get_process_by_name", {
+                "process_name": user_input,
                 "org_id": self.memory.org_id
             })
-            result_data = json.loads(tool_result)
-            
+            result_data = orjson.loads(tool_result)
+
             result["tool_called"] = True
-            result["tool_name"] = "get_events_for_process"
+            result["tool_name"] = "get_process_by_name"
             result["tool_result"] = tool_result
-            
-            if result_data.get("success"):
-                self.memory.event_id = result_data.get("suggestedNextEventId")
-                self.memory.page_id = self.memory.event_id
-                self.memory.current_state = WorkflowState.PAGE_TITLE_NEEDED
+            result["tool_result_parsed"] = result_data
+
+            if result_data.get("found"):
+                self.memory.process_id = int(result_data.get("processId"))
+                self.memory.process_name = result_data.get("processName")
+                self.memory.is_new_process = False
+                self.memory.current_state = WorkflowState.EVENT_NEEDED
                 result["state_changed"] = True
-                result["next_state"] = WorkflowState.PAGE_TITLE_NEEDED
-                result["action_taken"] = "event_id_retrieved"
-                print(f"[MEMORY] ✓ Stored eventId/pageId: {self.memory.event_id}")
-        
-        # PAGE_TITLE_NEEDED STATE
-        elif state == WorkflowState.PAGE_TITLE_NEEDED:
-            if user_input.lower() not in ["ok", "next", "continue", "proceed"]:
-                # User provided a page title
-                tool_result = await self._call_tool("generate_page_url", {"page_title": user_input})
-                result_data = json.loads(tool_result)
-                
-                result["tool_called"] = True
-                result["tool_name"] = "generate_page_url"
-                result["tool_result"] = tool_result
-                
-                if result_data.get("success"):
-                    self.memory.page_title = result_data.get("pageTitle")
-                    self.memory.page_url = result_data.get("pageURL")
-                    self.memory.current_state = WorkflowState.FIELDS_NEEDED
-                    result["state_changed"] = True
-                    result["next_state"] = WorkflowState.FIELDS_NEEDED
-                    result["action_taken"] = "page_title_set"
-                    print(f"[MEMORY] ✓ Stored page: {self.memory.page_title} -> {self.memory.page_url}")
+                result["next_state"] = WorkflowState.EVENT_NEEDED
+                result["action_taken"] = "process_found"
+                print(f"[MEMORY] ✓ Stored process: {self.memory.process_name} (ID: {self.memory.process_id})")
+                # EVENT_NEEDED needs nothing from the user, so reserve the
+                # event/page ID in this same turn.
+                await self._handle_event_needed(user_input, ui_lower, result)
+                if self.memory.current_state == WorkflowState.PAGE_TITLE_NEEDED:
+                    result["action_taken"] = "process_and_event_ready"
             else:
-                result["action_taken"] = "ask_for_page_title"
-        
-        # FIELDS_NEEDED STATE
-        elif state == WorkflowState.FIELDS_NEEDED:
-            if user_input.lower() in ["done", "finish", "complete", "no more fields"]:
-                if len(self.memory.fields) == 0:
-                    result["action_taken"] = "no_fields_added"
-                else:
-                    self.memory.current_state = WorkflowState.SQL_GENERATION
-                    result["state_changed"] = True
-                    result["next_state"] = WorkflowState.SQL_GENERATION
-                    result["action_taken"] = "fields_complete"
-                    result["field_count"] = len(self.memory.fields)
-            elif user_input.lower() in ["ok", "next", "continue", "proceed"]:
-                result["action_taken"] = "ask_for_fields"
+                result["action_taken"] = "process_not_found"
+        else:
+            result["action_taken"] = "ask_for_process_name"
+
+    async def _handle_event_needed(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Reserve the next event/page ID for an existing process"""
+        # Always get event ID automatically
+        tool_result = await self._call_tool("get_events_for_process", {
+            "process_id": self.memory.process_id,
+            "org_id": self.memory.org_id
+        })
+        result_data = orjson.loads(tool_result)
+
+        result["tool_called"] = True
+        result["tool_name"] = "get_events_for_process"
+        result["tool_result"] = tool_result
+        result["tool_result_parsed"] = result_data
+
+        if result_data.get("success"):
+            self.memory.event_id = result_data.get("suggestedNextEventId")
+            self.memory.page_id = self.memory.event_id
+            self.memory.current_state = WorkflowState.PAGE_TITLE_NEEDED
+            result["state_changed"] = True
+            result["next_state"] = WorkflowState.PAGE_TITLE_NEEDED
+            result["action_taken"] = "event_id_retrieved"
+            print(f"[MEMORY] ✓ Stored eventId/pageId: {self.memory.event_id}")
+
+    async def _handle_page_title_needed(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Set the page title and generate its URL"""
+        if ui_lower not in _SKIP_WORDS:
+            # User provided a page title
+            tool_result = await self._call_tool("generate_page_url", {"page_title": user_input})
+            result_data = orjson.loads(tool_result)
+
+            result["tool_called"] = True
+            result["tool_name"] = "generate_page_url"
+            result["tool_result"] = tool_result
+            result["tool_result_parsed"] = result_data
+
+            if result_data.get("success"):
+                self.memory.page_title = result_data.get("pageTitle")
+                self.memory.page_url = result_data.get("pageURL")
+                self.memory.current_state = WorkflowState.FIELDS_NEEDED
+                result["state_changed"] = True
+                result["next_state"] = WorkflowState.FIELDS_NEEDED
+                result["action_taken"] = "page_title_set"
+                print(f"[MEMORY] ✓ Stored page: {self.memory.page_title} -> {self.memory.page_url}")
+        else:
+            result["action_taken"] = "ask_for_page_title"
+
+    async def _handle_fields_needed(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Collect field IDs until the user says done"""
+        if ui_lower in _DONE_WORDS:
+            if len(self.memory.fields) == 0:
+                result["action_taken"] = "no_fields_added"
             else:
-                # User provided a field ID - check if it exists
-                tool_result = await self._call_tool("check_field_exists", {"field_id": user_input})
-                result_data = json.loads(tool_result)
-                
-                result["tool_called"] = True
-                result["tool_name"] = "check_field_exists"
-                result["tool_result"] = tool_result
-                
-                if result_data.get("found"):
-                    # Existing field
-                    self.memory.fields.append({
-                        "field_id": result_data.get("fieldId"),
-                        "existing": True,
-                        "display_type": result_data.get("displayType"),
-                        "validation_type": result_data.get("validationType")
-                    })
-                    result["action_taken"] = "field_added_existing"
-                    result["field_count"] = len(self.memory.fields)
-                    result["field_id"] = result_data.get("fieldId")
-                    print(f"[MEMORY] ✓ Added existing field: {result_data.get('fieldId')}")
-                else:
-                    # New field - create with defaults
-                    self.memory.fields.append({
-                        "field_id": user_input,
-                        "existing": False,
-                        "display_type": "label",
-                        "validation_type": "E"
-                    })
-                    result["action_taken"] = "field_added_new"
-                    result["field_count"] = len(self.memory.fields)
-                    result["field_id"] = user_input
-                    print(f"[MEMORY] ✓ Added new field: {user_input}")
-        
-        # SQL_GENERATION STATE
-        elif state == WorkflowState.SQL_GENERATION:
-            # Separate existing and new fields
-            existing_fields = [f for f in self.memory.fields if f.get("existing")]
-            new_fields = [f for f in self.memory.fields if not f.get("existing")]
-            
-            form_data = {
-                "org_id": self.memory.org_id,
-                "org_name": self.memory.org_name,
-                "process_id": self.memory.process_id,
-                "process_name": self.memory.process_name,
-                "is_new_process": self.memory.is_new_process,
-                "event_id": self.memory.event_id,
-                "page_id": self.memory.page_id,
-                "page_title": self.memory.page_title,
-                "page_url": self.memory.page_url,
-                "event_name": self.memory.page_title,
-                "group_id": self.memory.group_id,
-                "is_new_group": False,
-                "field_groups": [],
-                "new_fields": new_fields,  # Only new fields go here
-                "page_values": [
-                    {
-                        "field_id": field["field_id"],
-                        "group_id": self.memory.group_id,
-                        "field_group_id": self.memory.group_id,
-                        "display_label": field["field_id"].replace("_", " ").title(),
-                        "display_type": field.get("display_type", "label"),
-                        "validation_type": field.get("validation_type", "E")
-                    }
-                    for field in self.memory.fields  # All fields go here
-                ]
-            }
-            
-            tool_result = await self._call_tool("generate_form_page_sql", {
-                "form_data_json": json.dumps(form_data)
-            })
-            
+                self.memory.current_state = WorkflowState.SQL_GENERATION
+                result["state_changed"] = True
+                result["next_state"] = WorkflowState.SQL_GENERATION
+                result["action_taken"] = "fields_complete"
+                result["field_count"] = len(self.memory.fields)
+        elif ui_lower in _SKIP_WORDS:
+            result["action_taken"] = "ask_for_fields"
+        elif self._is_field_paste(user_input):
+            field_ids = [field_id for field_id in _FIELD_SEP.split(user_input) if field_id]
+            await self._add_fields_batch(field_ids, result)
+        elif user_input.lower() in self._known_field_ids():
+            result["action_taken"] = "fields_already_added"
+            result["field_count"] = len(self.memory.fields)
+            result["field_id"] = user_input
+        else:
+            # User provided a field ID - check if it exists
+            tool_result = await self._call_tool("check_field_exists", {"field_id": user_input})
+            result_data = orjson.loads(tool_result)
+
             result["tool_called"] = True
-            result["tool_name"] = "generate_form_page_sql"
+            result["tool_name"] = "check_field_exists"
             result["tool_result"] = tool_result
-            result["action_taken"] = "sql_generated"
-            
-            self.memory.current_state = WorkflowState.COMPLETE
-            result["state_changed"] = True
-            result["next_state"] = WorkflowState.COMPLETE
-        
-        return result
+            result["tool_result_parsed"] = result_data
+
+            if result_data.get("found"):
+                # Existing field
+                field = {
+                    "field_id": result_data.get("fieldId"),
+                    "display_label": _display_label(result_data.get("fieldId")),
+                    "existing": True,
+                    "display_type": result_data.get("displayType"),
+                    "validation_type": result_data.get("validationType")
+                }
+                self.memory.fields.append(field)
+                self.memory.existing_fields.append(field)
+                result["action_taken"] = "field_added_existing"
+                result["field_count"] = len(self.memory.fields)
+                result["field_id"] = result_data.get("fieldId")
+                print(f"[MEMORY] ✓ Added existing field: {result_data.get('fieldId')}")
+            else:
+                # New field - create with defaults
+                field = {
+                    "field_id": user_input,
+                    "display_label": _display_label(user_input),
+                    "existing": False,
+                    "display_type": "label",
+                    "validation_type": "E"
+                }
+                self.memory.fields.append(field)
+                self.memory.new_fields.append(field)
+                result["action_taken"] = "field_added_new"
+                result["field_count"] = len(self.memory.fields)
+                result["field_id"] = user_input
+                print(f"[MEMORY] ✓ Added new field: {user_input}")
+
+    @staticmethod
+    def _is_field_paste(user_input: str) -> bool:
+        """True for several IDs in one message: comma-separated, or plain words"""
+        words = user_input.split()
+        return "," in user_input or (len(words) > 1 and all(_FIELD_ID.fullmatch(word) for word in words))
+
+    def _known_field_ids(self) -> Set[str]:
+        """Lowercased IDs of the fields already on the form"""
+        return {field["field_id"].lower() for field in self.memory.fields}
+
+    async def _add_fields_batch(self, field_ids: List[str], result: Dict[str, Any]):
+        """Check several pasted field IDs with one tool call and add them all"""
+        # Drop repeats within the paste and IDs the form already has,
+        # keeping the first occurrence in paste order.
+        seen = self._known_field_ids()
+        unique_ids = []
+        for field_id in field_ids:
+            if field_id.lower() not in seen:
+                seen.add(field_id.lower())
+                unique_ids.append(field_id)
+        if not unique_ids:
+            result["action_taken"] = "fields_already_added"
+            result["field_count"] = len(self.memory.fields)
+            result["field_id"] = ", ".join(field_ids)
+            return
+        field_ids = unique_ids
+
+        tool_result = await self._call_tool("check_fields_exist_batch", {"field_ids": field_ids})
+        result_data = orjson.loads(tool_result)
+        result["tool_called"] = True
+        result["tool_name"] = "check_fields_exist_batch"
+        result["tool_result"] = tool_result
+        result["tool_result_parsed"] = result_data
+
+        checked = result_data.get("fields") or {}
+        added = []
+        for field_id in field_ids:
+            field_data = checked.get(field_id, {})
+            if field_data.get("found"):
+                field = {
+                    "field_id": field_data.get("fieldId"),
+                    "display_label": _display_label(field_data.get("fieldId")),
+                    "existing": True,
+                    "display_type": field_data.get("displayType"),
+                    "validation_type": field_data.get("validationType")
+                }
+                self.memory.existing_fields.append(field)
+            else:
+                # New field - create with defaults
+                field = {
+                    "field_id": field_id,
+                    "display_label": _display_label(field_id),
+                    "existing": False,
+                    "display_type": "label",
+                    "validation_type": "E"
+                }
+                self.memory.new_fields.append(field)
+            self.memory.fields.append(field)
+            added.append(field["field_id"])
+
+        result["action_taken"] = "fields_added"
+        result["field_count"] = len(self.memory.fields)
+        result["field_id"] = ", ".join(added)
+        print(f"[MEMORY] ✓ Added fields: {result['field_id']}")
+
+    async def _handle_sql_generation(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Build form_data from memory and generate the SQL"""
+        memory = self.memory
+        group_id = memory.group_id
+        form_data = {
+            "org_id": memory.org_id,
+            "org_name": memory.org_name,
+            "process_id": memory.process_id,
+            "process_name": memory.process_name,
+            "is_new_process": memory.is_new_process,
+            "event_id": memory.event_id,
+            "page_id": memory.page_id,
+            "page_title": memory.page_title,
+            "page_url": memory.page_url,
+            "event_name": memory.page_title,
+            "group_id": group_id,
+            "is_new_group": False,
+            "field_groups": [],
+            "new_fields": memory.new_fields,  # Only new fields go here
+            "page_values": [
+                {
+                    "field_id": field["field_id"],
+                    "group_id": group_id,
+                    "field_group_id": group_id,
+                    "display_label": field["display_label"],
+                    "display_type": field.get("display_type", "label"),
+                    "validation_type": field.get("validation_type", "E")
+                }
+                for field in memory.fields  # All fields go here
+            ]
+        }
 
-    async def chat(self, user_input: str) -> str:
-        """Process user input with hybrid state machine + LLM approach"""
+        tool_result = await self._call_tool("generate_form_page_sql", {
+            "form_data_json": orjson.dumps(form_data).decode()
+        })
+
+        result["tool_called"] = True
+        result["tool_name"] = "generate_form_page_sql"
+        result["tool_result"] = tool_result
+        result["action_taken"] = "sql_generated"
+
+        self.memory.current_state = WorkflowState.COMPLETE
+        result["state_changed"] = True
+        result["next_state"] = WorkflowState.COMPLETE
+
+    async def _handle_complete(self, user_input: str, ui_lower: str, result: Dict[str, Any]):
+        """Point at a reset once the SQL is out; memory holds a single page"""
+        result["action_taken"] = "workflow_already_complete"
+
+    _HANDLERS = {
+        WorkflowState.IDLE: _handle_idle,
+        WorkflowState.ORG_NEEDED: _handle_org_needed,
+        WorkflowState.PROCESS_NEEDED: _handle_process_needed,
+        WorkflowState.EVENT_NEEDED: _handle_event_needed,
+        WorkflowState.PAGE_TITLE_NEEDED: _handle_page_title_needed,
+        WorkflowState.FIELDS_NEEDED: _handle_fields_needed,
+        WorkflowState.SQL_GENERATION: _handle_sql_generation,
+        WorkflowState.COMPLETE: _handle_complete,
+    }
+
+    async def _prepare_turn(self, user_input: str) -> Tuple[Optional[str], List[BaseMessage]]:
+        """Run the state machine for one turn.
+
+        Returns (reply, []) when the turn is answered without the LLM,
+        otherwise (None, messages) with the prompt to send to the LLM.
+        """
         if not self.session:
             await self.initialize()
 
         # Handle special commands
-        if user_input.lower() in ["show memory", "show state", "status"]:
-            return self.memory.get_summary()
+        ui_lower = user_input.strip().lower()
+        command = _COMMANDS.get(ui_lower)
+        if command:
+            return command(self), []
         
-        if "process" in user_input.lower() and "id" in user_input.lower() and self.memory.process_id:
-            return f"The process ID for '{self.memory.process_name}' is: {self.memory.process_id}"
-
-        try:
-            # Get current state context
-            context = self._get_state_context()
-            
-            # Execute state machine logic (tools, state transitions)
-            state_result = await self._execute_state_logic(user_input, context)
-            
-            # CRITICAL FIX: If SQL was generated, return it directly without LLM
-            action_taken = state_result.get('action_taken')
-            if action_taken == "sql_generated":
-                tool_result = state_result.get('tool_result')
-                if tool_result:
-                    return tool_result
-                else:
-                    return "Error: SQL generation failed - no result returned"
-            
-            # Build prompt for LLM with state context
-            field_id = state_result.get('field_id', 'unknown')
-            # FIX: Get field_count from memory, not from state_result
-            field_count = len(self.memory.fields)
-            
-            system_prompt = f"""You are a helpful assistant for form page creation.
-
-CURRENT STATE: {context['current_state']}
-ACTION TAKEN: {action_taken}
-
-CRITICAL RESPONSE RULES:
-- If action_taken is "workflow_started", respond: "Great! Which organization is this form page for? (Provide the legal name)"
-- If action_taken is "organization_found", respond: "Found [orgName] (ID: [orgId]). Which process should this form page belong to?"
-- If action_taken is "ask_for_process_name", respond: "Which process should this form page belong to? (Provide the process name)"
-- If action_taken is "process_found", respond: "Found process '[processName]' (ID: [processId]). Moving to next step..."
-- If action_taken is "event_id_retrieved", respond: "Event ID: [eventId] assigned. What should the page title be?"
-- If action_taken is "ask_for_page_title", respond: "What should the page title be? (e.g., 'Task Details')"
-- If action_taken is "page_title_set", respond: "Page '[pageTitle]' created with URL: [pageURL]. Ready to add fields. What field ID do you want to add? (or say 'done')"
-- If action_taken is "ask_for_fields", respond: "What field ID do you want to add? (Provide field ID, or say 'done' to finish)"
-- If action_taken is "field_added_existing", respond: "Field '{field_id}' added ({field_count} total). Add another field or say 'done'."
-- If action_taken is "field_added_new", respond: "New field '{field_id}' will be created ({field_count} total). Add another field or say 'done'."
-- If action_taken is "no_fields_added", respond: "You haven't added any fields yet. Please add at least one field."
-- If action_taken is "fields_complete", respond: "Collected {field_count} fields. Generating SQL..."
-- If action_taken is "sql_generated", output the raw SQL from tool_result without modification
-- If action_taken is "organization_not_found", respond: "Organization not found. Please provide the exact legal name."
-- If action_taken is "process_not_found", respond: "Process not found. Please check the process name."
+        if self.memory.process_id and _PROCESS_ID_Q.search(ui_lower):
+            return f"The process ID for '{self.memory.process_name}' is: {self.memory.process_id}", []
 
-TOOL RESULT:
-{json.dumps(state_result.get('tool_result'), indent=2) if state_result.get('tool_result') else 'None'}
+        # Get current state context
+        context = self._get_state_context()
+        
+        # Execute state machine logic (tools, state transitions)
+        state_result = await self._execute_state_logic(user_input, context)
+        
+        # CRITICAL FIX: If SQL was generated, return it directly without LLM
+        action_taken = state_result.get('action_taken')
+        if action_taken == "sql_generated":
+            tool_result = state_result.get('tool_result')
+            if tool_result:
+                return tool_result, []
+            else:
+                return "Error: SQL generation failed - no result returned", []
 
-Additional context:
-- field_id: {field_id}
-- field_count: {field_count}
+        template = _RESPONSE_TEMPLATES.get(action_taken)
+        if template:
+            reply = template.format_map(self._template_values(state_result))
+            self._remember(user_input, reply)
+            return reply, []
+        
+        # Build prompt for LLM with state context
+        # The server's tool results are indented JSON; when the turn already
+        # parsed one, send it compact to keep the prompt short.
+        parsed = state_result.get('tool_result_parsed')
+        tool_result = orjson.dumps(parsed).decode() if parsed is not None else state_result.get('tool_result') or 'None'
+
+        memory = self.memory
+        turn_prompt = _TURN_PROMPT.format(
+            current_state=context['current_state'],
+            action_taken=action_taken,
+            tool_result=tool_result,
+            field_id=state_result.get('field_id', 'unknown'),
+            field_count=len(memory.fields),
+        )
+
+        messages = [
+            _SYSTEM_PROMPT_RULES,
+            SystemMessage(content=turn_prompt),
+            *self.conversation_history,
+            HumanMessage(content=user_input)
+        ]
+        return None, messages
+
+    def _template_values(self, state_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Values available to _RESPONSE_TEMPLATES for the current turn"""
+        memory = self.memory
+        return {
+            "org_id": memory.org_id,
+            "org_name": memory.org_name,
+            "process_id": state_result.get("process_id", memory.process_id),
+            "process_name": memory.process_name,
+            "event_id": memory.event_id,
+            "page_title": memory.page_title,
+            "page_url": memory.page_url,
+            "field_id": state_result.get("field_id", "unknown"),
+            "field_count": len(memory.fields),
+        }
 
-Extract exact values from tool_result and provide clear response."""
+    def _remember(self, user_input: str, response_text: str):
+        """Append a completed turn to the conversation history"""
+        self.conversation_history.append(HumanMessage(content=user_input))
+        self.conversation_history.append(AIMessage(content=response_text))
 
-            messages = [
-                SystemMessage(content=system_prompt),
-                *self.conversation_history[-4:],
-                HumanMessage(content=user_input)
-            ]
+    async def chat(self, user_input: str) -> str:
+        """Process user input with hybrid state machine + LLM approach"""
+        try:
+            reply, messages = await self._prepare_turn(user_input)
+            if reply is not None:
+                return reply
 
             # Let LLM generate the response
-            response = await self.llm.ainvoke(messages)
-            response_text = response.content
-
-            # Update history
-            self.conversation_history.append(HumanMessage(content=user_input))
-            self.conversation_history.append(AIMessage(content=response_text))
-
+            cache_key = ReplyCache.key(self.llm, messages)
+            response_text = await ReplyCache.get(cache_key) if cache_key else None
+            if response_text is None:
+                response = await self.llm.ainvoke(messages)
+                response_text = response.content
+                if cache_key:
+                    await ReplyCache.set(cache_key, response_text)
+            self._remember(user_input, response_text)
             return response_text
 
         except Exception as e:
             return f"Error: {str(e)}"
 
-    async def _call_tool(self, tool_name: str, arguments: dict) -> str:
-        """Call MCP tool directly"""
+    async def chat_stream(self, user_input: str) -> AsyncIterator[str]:
+        """Like chat(), but yields the LLM reply token by token as it is generated"""
         try:
-            result = await self.session.call_tool(tool_name, arguments)
-            if result.content:
-                return result.content[0].text
-            return json.dumps({"success": False, "error": "No result"})
-        except Exception as e:
-            return json.dumps({"success": False, "error": str(e)})
+            reply, messages = await self._prepare_turn(user_input)
+            if reply is not None:
+                yield reply
+                return
+
+            cache_key = ReplyCache.key(self.llm, messages)
+            cached = await ReplyCache.get(cache_key) if cache_key else None
+            if cached is not None:
+                self._remember(user_input, cached)
+                yield cached
+                return
+
+            chunks = []
+            async for chunk in self.llm.astream(messages):
+                # Ollama's last chunk carries only metadata; don't emit it
+                # as an empty delta.
+                if not chunk.content:
+                    continue
+                chunks.append(chunk.content)
+                yield chunk.content
+            response_text = "".join(chunks)
+            self._remember(user_input, response_text)
+            if cache_key:
+                await ReplyCache.set(cache_key, response_text)
 
-    async def close(self):
-        """Close MCP connection"""
-        await self.exit_stack.aclose()
+        except Exception as e:
+            yield f"Error: {str(e)}"
 
 async def main():
     print("=" * 60)
@@ -478,11 +704,13 @@ async def main():
             if not user_input.strip():
                 continue
 
-            response = await assistant.chat(user_input)
-            print(f"\n🤖 Assistant: {response}\n")
-            
-            # Show current state
-            print(f"[State: {assistant.memory.current_state}]\n")
+            # Print the reply as it is generated rather than after the
+            # whole LLM response is in.
+            print("\n🤖 Assistant: ", end="", flush=True)
+            async for piece in assistant.chat_stream(user_input):
+                print(piece, end="", flush=True)
+            # End of reply and current state in one write.
+            print(f"\n\n[State: {assistant.memory.current_state}]\n")
 
     finally:
         await assistant.close()
@@ -490,4 +718,10 @@ async def main():
     print("\n👋 Goodbye!")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # Same loop as the API server; req.txt skips uvloop on Windows.
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
@@ -1,11 +1,19 @@
 from fastmcp import FastMCP
-import httpx
-from datetime import datetime, date
-from sqlalchemy import create_engine, text
+import atexit
+from collections import ChainMap
+from contextlib import contextmanager
+from datetime import date
+import functools
+import hashlib
+import io
+import queue
+import time
+from sqlalchemy import bindparam, create_engine, inspect, text
 import json
+import orjson
 import os
 from dotenv import load_dotenv
-from jinja2 import Template
+from jinja2 import BaseLoader, Environment
 
 load_dotenv()
 
@@ -22,307 +30,453 @@ def sql_escape(value):
     """Escape single quotes for SQL strings"""
     if value is None:
         return 'NULL'
-    return str(value).replace("'", "''")
+    s = str(value)
+    # Most values (ids, camelCase names, codes) have no quote to escape.
+    return s if "'" not in s else s.replace("'", "''")
 
-def generate_sql_statements(form_data: dict) -> str:
-    """Generate complete SQL INSERT statements using Jinja2 templates"""
-    today = date.today().isoformat()
-    output = []
-    output.append(f"Organization: {form_data.get('org_name')} (orgId: {form_data.get('org_id')})")
-    output.append(f"Process: {form_data.get('process_name')} (processId: {form_data.get('process_id')})")
-    output.append(f"Page: {form_data.get('page_title')} (pageId: {form_data.get('page_id')})")
-    output.append("")
-    
-
-    if form_data.get('is_new_process'):
-        template = Template("""
+# The single-row INSERTs have no control flow, so they are plain str.format templates;
+# string values are passed through sql_escape before formatting.
+_SQL_ORG_PROCESSES = """
 INSERT INTO orgProcesses (
     recSeq, orgId, recStatus, processId, processName, processGroupCode, pageId, platformAccess, geoFenced, 
     timeFenced, apiRouteName, externalURL, dataStatus, displaySeq, iconURL, isDefaultURL, fromDate, endDate, 
     createdBy, createdOn, modifiedBy, modifiedOn
 ) VALUES (
-    1, '{{ org_id }}', 'A', {{ process_id }}, '{{ process_name | replace("'", "''") }}', NULL, {{ process_id }}, NULL, NULL, 
-    NULL, '{{ process_name | replace("'", "''") }}', NULL, 'A', 0, NULL, 0, '{{ today }}', NULL, 
+    1, '{org_id}', 'A', {process_id}, '{process_name}', NULL, {process_id}, NULL, NULL, 
+    NULL, '{process_name}', NULL, 'A', 0, NULL, 0, '{today}', NULL, 
     'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
-);""")
-        output.append(template.render(
-            process_id=form_data['process_id'],
-            org_id=form_data['org_id'],
-            process_name=form_data['process_name'],
-            today=today
-        ))
-        output.append("")
-    
+);"""
 
-    template = Template("""
+_SQL_ORG_PROCESS_EVENTS = """
 INSERT INTO orgProcessEvents (
     recSeq, orgId, recStatus, dataStatus, processId, eventId, eventName, eventGroupCode, pageId, eventProcessingFile, 
     isMenu, platformAccess, timeFenced, showMenu, displaySeq, fromDate, endDate, createdBy, createdOn, 
     modifiedBy, modifiedOn
 ) VALUES (
-    1, '{{ org_id }}', 'A', 'A', {{ process_id }}, {{ event_id }}, '{{ event_name | replace("'", "''") }}', NULL, {{ page_id }}, '', 
-    'Y', NULL, NULL, 'Y', 10, '{{ today }}', NULL, 'ADMIN', CURRENT_TIMESTAMP, 
+    1, '{org_id}', 'A', 'A', {process_id}, {event_id}, '{event_name}', NULL, {page_id}, '', 
+    'Y', NULL, NULL, 'Y', 10, '{today}', NULL, 'ADMIN', CURRENT_TIMESTAMP, 
     'ADMIN', CURRENT_TIMESTAMP
-);""")
-    output.append(template.render(
-        event_id=form_data['event_id'],
-        process_id=form_data['process_id'],
-        org_id=form_data['org_id'],
-        page_id=form_data['page_id'],
-        event_name=form_data.get('event_name', form_data['page_title']),
-        today=today
-    ))
-    output.append("")
+);"""
 
-    template = Template("""
+_SQL_ADMIN_PAGES = """
 INSERT INTO adminPages (
     pageId, recStatus, pageURL, pageTitle, pageDisplayName, processId, eventId, pageType, 
     hideProcessEvents, pageSize, language, createdBy, createdOn, modifiedBy, modifiedOn
 ) VALUES (
-    {{ page_id }}, 'A', '{{ page_url }}', '{{ page_title | replace("'", "''") }}', '{{ page_title | replace("'", "''") }}', {{ process_id }}, {{ event_id }}, 'F', 
+    {page_id}, 'A', '{page_url}', '{page_title}', '{page_title}', {process_id}, {event_id}, 'F', 
     'Y', 12, 'en_US', 'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
-);""")
-    output.append(template.render(
-        page_id=form_data['page_id'],
-        process_id=form_data['process_id'],
-        event_id=form_data['event_id'],
-        page_title=form_data['page_title'],
-        page_url=form_data['page_url'],
-        today=today
-    ))
-    output.append("")
-    
+);"""
 
-    if form_data.get('is_new_group'):
-        template = Template("""
+_SQL_ADMIN_FORM_GROUPS = """
 INSERT INTO adminFormGroups (
     groupId, recStatus, groupName, groupStatus, displayDivLength, displaySeq, 
     createdBy, createdOn, modifiedBy, modifiedOn
 ) VALUES (
-    {{ group_id }}, 'A', '{{ group_name | replace("'", "''") }}', 'A', 12, 0, 
+    {group_id}, 'A', '{group_name}', 'A', 12, 0, 
     'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
-);""")
-        output.append(template.render(
-            group_id=form_data['group_id'],
-            group_name=form_data.get('group_name', f"Group_{form_data['group_id']}"),
-            today=today
-        ))
-        output.append("")
-  
-    if form_data.get('field_groups') and len(form_data['field_groups']) > 0:
-        template = Template("""INSERT INTO adminFieldGroups (
+);"""
+
+_JINJA_ENV = Environment(loader=BaseLoader(), auto_reload=False, cache_size=400,
+                         trim_blocks=True, lstrip_blocks=True, autoescape=False)
+_JINJA_ENV.filters['sq'] = sql_escape
+
+# The per-row tables loop inside the template, emitting one multi-row INSERT per table.
+_TPL_ADMIN_FIELD_GROUPS = _JINJA_ENV.from_string("""INSERT INTO adminFieldGroups (
     fieldGroupId, recStatus, groupId, fieldGroupStatus, displayDivLength, displaySeq, 
     createdBy, createdOn, modifiedBy, modifiedOn
-) VALUES (
+) VALUES
+{% for field_group_id in field_groups %}
+(
     {{ field_group_id }}, 'A', {{ group_id }}, 'A', 12, 0, 
     'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
-);""")
-        for fg_id in form_data['field_groups']:
-            output.append(template.render(
-                field_group_id=fg_id,
-                group_id=form_data['group_id'],
-                today=today
-            ))
-        output.append("")
-    
+){{ ";" if loop.last else "," }}
+{% endfor %}""")
 
-    if form_data.get('new_fields') and len(form_data['new_fields']) > 0:
-        template = Template("""INSERT INTO adminFields (
+_TPL_ADMIN_FIELDS = _JINJA_ENV.from_string("""INSERT INTO adminFields (
     fieldId, recStatus, fieldType, fieldStatus, dataFieldId, remarks, fromDate, 
     displayType, defaultValue, validationType, createdBy, createdOn, modifiedBy, modifiedOn
-) VALUES (
-    '{{ field_id }}', 'A', 'D', 'A', '{{ field_id }}', '', '{{ today }}', 
-    '{{ display_type }}', '', '{{ validation_type }}', 'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
-);""")
-        for field in form_data['new_fields']:
-            output.append(template.render(
-                field_id=field['field_id'],
-                display_type=field.get('display_type', 'label'),
-                validation_type=field.get('validation_type', 'E'),
-                today=today
-            ))
-        output.append("")
-    
+) VALUES
+{% for field in new_fields %}
+(
+    '{{ field.field_id }}', 'A', 'D', 'A', '{{ field.field_id }}', '', '{{ today }}', 
+    '{{ field.display_type | default('label') }}', '', '{{ field.validation_type | default('E') }}', 'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
+){{ ";" if loop.last else "," }}
+{% endfor %}""")
 
-    if form_data.get('page_values') and len(form_data['page_values']) > 0:
-        template = Template("""INSERT INTO orgPageValues (
+_TPL_ORG_PAGE_VALUES = _JINJA_ENV.from_string("""INSERT INTO orgPageValues (
     pageId, recSeq, orgId, recStatus, groupId, fieldGroupId, fieldId, 
     displayLabel, displayType, displaySubType, displayChannel, displayDivLength, displayLanguage, displaySeq, 
     displayDataLength, labelAlignment, required, mandatory, pageValueStatus, dependsOn, dependsOnValue, isRelativeTimeZone, 
     noWrap, isFilterable, sortable,  fromDate, helpText, defaultValue, validationType, 
     createdBy, createdOn, modifiedBy, modifiedOn
-) VALUES (
-    {{ page_id }}, {{ rec_seq }}, '{{ org_id }}', 'A', {{ group_id }}, {{ field_group_id }}, '{{ field_id }}', 
-    '{% if display_label %}{{ display_label | replace("'", "''") }}{% else %}NULL{% endif %}', 
-    '{% if display_type %}{{ display_type }}{% else %}NULL{% endif %}', 'search',
+) VALUES
+{% for pv in page_values %}
+(
+    {{ pv.page_id }}, {{ pv.rec_seq | default(loop.index) }}, '{{ pv.org_id }}', 'A', {{ pv.group_id }}, {{ pv.field_group_id }}, '{{ pv.field_id }}', 
+    '{% if pv.display_label %}{{ pv.display_label | sq }}{% else %}NULL{% endif %}', 
+    '{% if pv.display_type %}{{ pv.display_type }}{% else %}NULL{% endif %}', 'search',
     'D', 12, 'en_US', 10, 0,
     'left', 'Y', 'Y', 'A','', NULL, 0, 'Y', 
-    NULL, NULL, '{{ today }}', '', '', 
-    '{% if validation_type %}{{ validation_type }}{% else %}NULL{% endif %}', 
+    NULL, NULL, '{{ pv.today }}', '', '', 
+    '{% if pv.validation_type %}{{ pv.validation_type }}{% else %}NULL{% endif %}', 
     'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
-);""")
-        for idx, pv in enumerate(form_data['page_values'], 1):
-           
-            base_data = {
-                'page_id': form_data['page_id'],
-                'org_id': form_data['org_id'],
-                'group_id': form_data.get('group_id', 1),
-                'field_group_id': form_data.get('group_id', 1),
-                'rec_seq': idx,
-                'today': today
-            }
-            render_context = {**base_data, **pv}
-            output.append(template.render(render_context))
-        output.append("")
-    
+){{ ";" if loop.last else "," }}
+{% endfor %}""")
+
+def _write_new_process(buf, form_data: dict, today: str):
+    buf.write(_SQL_ORG_PROCESSES.format(
+        process_id=form_data['process_id'],
+        org_id=form_data['org_id'],
+        process_name=sql_escape(form_data['process_name']),
+        today=today
+    ))
+    buf.write("\n\n")
+
+def _write_event_and_page(buf, form_data: dict, today: str):
+    buf.write(_SQL_ORG_PROCESS_EVENTS.format(
+        event_id=form_data['event_id'],
+        process_id=form_data['process_id'],
+        org_id=form_data['org_id'],
+        page_id=form_data['page_id'],
+        event_name=sql_escape(form_data.get('event_name', form_data['page_title'])),
+        today=today
+    ))
+    buf.write("\n\n")
+
+    buf.write(_SQL_ADMIN_PAGES.format(
+        page_id=form_data['page_id'],
+        process_id=form_data['process_id'],
+        event_id=form_data['event_id'],
+        page_title=sql_escape(form_data['page_title']),
+        page_url=form_data['page_url'],
+        today=today
+    ))
+    buf.write("\n\n")
+
+def _write_new_group(buf, form_data: dict, today: str):
+    buf.write(_SQL_ADMIN_FORM_GROUPS.format(
+        group_id=form_data['group_id'],
+        group_name=sql_escape(form_data.get('group_name', f"Group_{form_data['group_id']}")),
+        today=today
+    ))
+    buf.write("\n\n")
+
+# The looped templates already end in a newline, so one more gives the blank separator line.
+def _write_field_groups(buf, form_data: dict, today: str):
+    buf.write(_TPL_ADMIN_FIELD_GROUPS.render(
+        field_groups=form_data['field_groups'],
+        group_id=form_data['group_id']
+    ))
+    buf.write("\n")
+
+def _write_new_fields(buf, form_data: dict, today: str):
+    buf.write(_TPL_ADMIN_FIELDS.render(
+        new_fields=form_data['new_fields'],
+        today=today
+    ))
+    buf.write("\n")
+
+def _write_page_values(buf, form_data: dict, today: str):
+    group_id = form_data.get('group_id', 1)
+    base_data = {
+        'page_id': form_data['page_id'],
+        'org_id': form_data['org_id'],
+        'group_id': group_id,
+        'field_group_id': group_id,
+        'today': today
+    }
+    # Row keys shadow the shared defaults without copying them per row; recSeq defaults to the row number.
+    page_values = [ChainMap(pv, base_data) for pv in form_data['page_values']]
+    buf.write(_TPL_ORG_PAGE_VALUES.render(page_values=page_values))
+    buf.write("\n")
+
+def _shape_key(form_data: dict) -> tuple:
+    return (
+        bool(form_data.get('is_new_process')),
+        bool(form_data.get('is_new_group')),
+        bool(form_data.get('field_groups')),
+        bool(form_data.get('new_fields')),
+        bool(form_data.get('page_values'))
+    )
+
+@functools.lru_cache(maxsize=32)
+def _section_writers(shape: tuple) -> tuple:
+    """Section writers for one form shape, in output order; built once per shape"""
+    is_new_process, is_new_group, has_field_groups, has_new_fields, has_page_values = shape
+    writers = []
+    if is_new_process:
+        writers.append(_write_new_process)
+    writers.append(_write_event_and_page)
+    if is_new_group:
+        writers.append(_write_new_group)
+    if has_field_groups:
+        writers.append(_write_field_groups)
+    if has_new_fields:
+        writers.append(_write_new_fields)
+    if has_page_values:
+        writers.append(_write_page_values)
+    return tuple(writers)
+
+def generate_sql_statements(form_data: dict) -> str:
+    """Generate complete SQL INSERT statements from the module-level SQL templates"""
+    today = date.today().isoformat()
+    buf = io.StringIO()
+    buf.write(f"Organization: {form_data.get('org_name')} (orgId: {form_data.get('org_id')})\n")
+    buf.write(f"Process: {form_data.get('process_name')} (processId: {form_data.get('process_id')})\n")
+    buf.write(f"Page: {form_data.get('page_title')} (pageId: {form_data.get('page_id')})\n\n")
     
-    return "\n".join(output)
+    for write in _section_writers(_shape_key(form_data)):
+        write(buf, form_data, today)
+    return buf.getvalue()
+
+# Generated SQL keyed by payload and day (fromDate embeds today); oldest quarter evicted when full.
+_SQL_CACHE: dict[bytes, str] = {}
+_SQL_CACHE_MAX = 256
+
+def _hash_form(form_data: dict, today: str) -> bytes:
+    """Canonical digest of a form payload for the SQL cache"""
+    canonical = orjson.dumps([today, form_data], option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.blake2b(canonical, digest_size=16).digest()
+
+# Idle AUTOCOMMIT connections kept checked out between tool calls, so the read-only
+# tools skip the pool checkout and the BEGIN/ROLLBACK around every query.
+_IDLE_CONNS: "queue.SimpleQueue" = queue.SimpleQueue()
+_CONN_IDLE_MAX = 300
+
+def _dumps(obj) -> str:
+    """Serialize a tool response as indented JSON; Decimal and other exotic types fall back to str"""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2, default=str).decode()
+
+@contextmanager
+def _read_conn():
+    """Borrow a reusable AUTOCOMMIT connection for a read-only tool"""
+    conn = None
+    while conn is None:
+        try:
+            conn, last_used = _IDLE_CONNS.get_nowait()
+        except queue.Empty:
+            conn = org_engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+            break
+        if conn.invalidated or time.monotonic() - last_used > _CONN_IDLE_MAX:
+            conn.close()
+            conn = None
+    try:
+        yield conn
+    finally:
+        if conn.invalidated or conn.closed:
+            conn.close()
+        else:
+            _IDLE_CONNS.put((conn, time.monotonic()))
+
+@atexit.register
+def _close_idle_conns():
+    while True:
+        try:
+            conn, _ = _IDLE_CONNS.get_nowait()
+        except queue.Empty:
+            return
+        conn.close()
+
+# Schema metadata for the generic table tools, reflected once and reused. Table and
+# column names are checked against it before being interpolated into SQL.
+@functools.lru_cache(maxsize=1)
+def _inspector():
+    return inspect(org_engine)
+
+@functools.lru_cache(maxsize=1)
+def _table_names() -> dict:
+    return {name.lower(): name for name in _inspector().get_table_names()}
+
+def _resolve_table(table_name: str) -> str:
+    """Canonical name of an existing table; refreshes the cached metadata once on a miss"""
+    name = _table_names().get(table_name.lower())
+    if name is None:
+        _table_names.cache_clear()
+        _inspector().clear_cache()
+        name = _table_names().get(table_name.lower())
+        if name is None:
+            raise ValueError(f"Unknown table '{table_name}'")
+    return name
+
+def _resolve_column(table: str, column_name: str) -> str:
+    """Canonical name of a column of an already-resolved table"""
+    for col in _inspector().get_columns(table):
+        if col["name"].lower() == column_name.lower():
+            return col["name"]
+    raise ValueError(f"Unknown column '{column_name}' in table '{table}'")
+
+@functools.lru_cache(maxsize=256)
+def _select_by_column(table: str, column: str, limit: int):
+    quote = org_engine.dialect.identifier_preparer.quote
+    return text(f"SELECT * FROM {quote(table)} WHERE {quote(column)} = :search_value LIMIT {int(limit)}")
+
+# Fixed queries, built once rather than per tool call.
+_Q_ORG_TABLES = text("SHOW TABLES")
+_Q_ORGANIZATION_BY_NAME = text("SELECT orgId, legalName FROM organizations WHERE legalName = :legal_name")
+_Q_MAX_PROCESS_ID = text("SELECT MAX(processId) FROM orgProcesses")
+_Q_PROCESS_BY_NAME = text("""
+    SELECT processId, processName, orgId
+    FROM orgProcesses 
+    WHERE processName = :process_name 
+    AND orgId = :org_id
+""")
+_Q_EVENTS_FOR_PROCESS = text("""
+    SELECT eventId, eventName, pageId 
+    FROM orgProcessEvents 
+    WHERE processId = :process_id AND orgId = :org_id
+    ORDER BY eventId
+""")
+_Q_EVENT_STATS = text("""
+    SELECT MAX(eventId), COUNT(*)
+    FROM orgProcessEvents 
+    WHERE processId = :process_id AND orgId = :org_id
+""")
+_Q_CHECK_FIELD = text("""
+    SELECT fieldId, dataFieldId, fieldType, displayType, validationType 
+    FROM adminFields 
+    WHERE LOWER(fieldId) = LOWER(:field_id)
+""")
+_Q_CHECK_FIELDS_BATCH = text("""
+    SELECT fieldId, dataFieldId, fieldType, displayType, validationType 
+    FROM adminFields 
+    WHERE LOWER(fieldId) IN :field_ids
+""").bindparams(bindparam("field_ids", expanding=True))
 
 @mcp.tool()
 def get_org_tables() -> str:
     """Get list of all tables in the orgMaster db"""
     try:
-        with org_engine.connect() as conn:
-            result = conn.execute(text("SHOW TABLES"))
+        with _read_conn() as conn:
+            result = conn.execute(_Q_ORG_TABLES)
             tables = sorted([row[0] for row in result])
-            return json.dumps({"success": True, "tables": tables, "count": len(tables)}, indent=2)
+            return _dumps({"success": True, "tables": tables, "count": len(tables)})
     except Exception as e:
-        return json.dumps({"success": False, "error": str(e)}, indent=2)
+        return _dumps({"success": False, "error": str(e)})
 
 @mcp.tool()
 def describe_org_table(table_name: str) -> str:
     """Get schema/structure of a particular table"""
     try:
-        with org_engine.connect() as conn:
-            result = conn.execute(text(f"DESCRIBE {table_name}"))
-            columns = result.keys()
-            rows = [dict(zip(columns, row)) for row in result]
-            return json.dumps({"success": True, "table": table_name, "schema": rows}, indent=2, default=str)
+        table = _resolve_table(table_name)
+        # The name is whitelisted against the reflected tables and quoted, so
+        # DESCRIBE itself stays the source of Key/Default/Extra.
+        quote = org_engine.dialect.identifier_preparer.quote
+        with _read_conn() as conn:
+            rows = [dict(row) for row in conn.execute(text(f"DESCRIBE {quote(table)}")).mappings()]
+        return _dumps({"success": True, "table": table, "schema": rows})
     except Exception as e:
-        return json.dumps({"success": False, "error": str(e)}, indent=2)
+        return _dumps({"success": False, "error": str(e)})
 
 @mcp.tool()
 def get_organization_by_name(legal_name: str) -> str:
     """Get organization details by legal name. Returns orgId needed for form page creation."""
     try:
-        with org_engine.connect() as conn:
-            query = text("SELECT orgId, legalName FROM organizations WHERE legalName = :legal_name")
-            result = conn.execute(query, {"legal_name": legal_name})
+        with _read_conn() as conn:
+            result = conn.execute(_Q_ORGANIZATION_BY_NAME, {"legal_name": legal_name})
             row = result.fetchone()
             
             if row:
-                return json.dumps({
+                return _dumps({
                     "success": True,
                     "found": True,
                     "orgId": row[0],
                     "legalName": row[1]
-                }, indent=2, default=str)
+                })
             else:
-                return json.dumps({
+                return _dumps({
                     "success": True,
                     "found": False,
                     "message": f"Organization '{legal_name}' not found"
-                }, indent=2)
+                })
     except Exception as e:
-        return json.dumps({"success": False, "error": str(e)}, indent=2)
+        return _dumps({"success": False, "error": str(e)})
 
 @mcp.tool()
 def get_process_by_name(process_name: str, org_id: str) -> str:
     """Check if a process exists for a specific organization. Returns processId if found."""
     try:
-        with org_engine.connect() as conn:
-            query = text("""
-                SELECT processId, processName, orgId
-                FROM orgProcesses 
-                WHERE processName = :process_name 
-                AND orgId = :org_id
-            """)
-            result = conn.execute(query, {
+        with _read_conn() as conn:
+            result = conn.execute(_Q_PROCESS_BY_NAME, {
                 "process_name": process_name,
                 "org_id": org_id
             })
             row = result.fetchone()
             
             if row:
-                return json.dumps({
+                return _dumps({
                     "success": True,
                     "found": True,
                     "processId": row[0],
                     "processName": row[1],
                     "orgId": row[2]
-                }, indent=2)
+                })
             else:
-                return json.dumps({
+                return _dumps({
                     "success": True,
                     "found": False,
                     "message": f"Process '{process_name}' not found for organization ID {org_id}"
-                }, indent=2)
+                })
     except Exception as e:
-        return json.dumps({"success": False, "error": str(e)}, indent=2)
+        return _dumps({"success": False, "error": str(e)})
     
 @mcp.tool()
 def get_max_process_id() -> str:
     """Get the maximum processId to calculate next processId (max + 100) for new process."""
     try:
-        with org_engine.connect() as conn:
-            result = conn.execute(text("SELECT MAX(processId) FROM orgProcesses"))
+        with _read_conn() as conn:
+            result = conn.execute(_Q_MAX_PROCESS_ID)
             max_id = result.fetchone()[0]
             next_id = (max_id if max_id else 0) + 100
             
-            return json.dumps({
+            return _dumps({
                 "success": True,
                 "maxProcessId": max_id if max_id else 0,
                 "suggestedNextProcessId": next_id
-            }, indent=2)
+            })
     except Exception as e:
-        return json.dumps({"success": False, "error": str(e)}, indent=2)
+        return _dumps({"success": False, "error": str(e)})
 
 @mcp.tool()
-def get_events_for_process(process_id: int, org_id: str) -> str:
+def get_events_for_process(process_id: int, org_id: str, include_list: bool = False) -> str:
     """
-    Get all events for a process. Returns next available eventId (max + 1).
+    Get the events summary for a process. Returns next available eventId (max + 1).
     
     Args:
         process_id: The process ID to query events for
         org_id: The organization ID
+        include_list: Also return the full events list (default: only max/count)
     
     Returns:
-        JSON string with events list and suggested next eventId
+        JSON string with event count, suggested next eventId and optionally the events list
     """
     try:
-        with org_engine.connect() as conn:
-            query = text("""
-                SELECT eventId, eventName, pageId 
-                FROM orgProcessEvents 
-                WHERE processId = :process_id AND orgId = :org_id
-                ORDER BY eventId
-            """)
-            result = conn.execute(query, {"process_id": process_id, "org_id": org_id})
-            events = [{"eventId": row[0], "eventName": row[1], "pageId": row[2]} for row in result]
-            
-            if events:
-                max_event_id = max([e["eventId"] for e in events])
-                next_event_id = max_event_id + 1
-            else:
-                max_event_id = None
-                next_event_id = process_id
+        params = {"process_id": process_id, "org_id": org_id}
+        with _read_conn() as conn:
+            max_event_id, count = conn.execute(_Q_EVENT_STATS, params).fetchone()
+            if include_list:
+                events = [{"eventId": row[0], "eventName": row[1], "pageId": row[2]}
+                          for row in conn.execute(_Q_EVENTS_FOR_PROCESS, params)]
             
-            return json.dumps({
-                "success": True,
-                "events": events,
-                "count": len(events),
-                "maxEventId": max_event_id,
-                "suggestedNextEventId": next_event_id,
-                "message": f"Found {len(events)} existing events. Next available eventId: {next_event_id}"
-            }, indent=2)
+        next_event_id = max_event_id + 1 if max_event_id is not None else process_id
+        
+        response = {
+            "success": True,
+            "count": count,
+            "maxEventId": max_event_id,
+            "suggestedNextEventId": next_event_id,
+            "message": f"Found {count} existing events. Next available eventId: {next_event_id}"
+        }
+        if include_list:
+            response["events"] = events
+        return _dumps(response)
             
     except Exception as e:
-        return json.dumps({
+        return _dumps({
             "success": False,
             "error": str(e),
             "error_type": type(e).__name__,
             "message": f"Database error while fetching events: {str(e)}"
-        }, indent=2)
+        })
 
 @mcp.tool()
 def check_field_exists(field_id: str) -> str:
@@ -331,18 +485,12 @@ def check_field_exists(field_id: str) -> str:
     Returns field details if found.
     """
     try:
-        with org_engine.connect() as conn:
-            query = text("""
-                SELECT fieldId, dataFieldId, fieldType, displayType, validationType 
-                FROM adminFields 
-                WHERE LOWER(fieldId) = LOWER(:field_id)
-            """)
-            
-            result = conn.execute(query, {"field_id": field_id})
+        with _read_conn() as conn:
+            result = conn.execute(_Q_CHECK_FIELD, {"field_id": field_id})
             row = result.fetchone()
             
             if row:
-                return json.dumps({
+                return _dumps({
                     "success": True,
                     "found": True,
                     "fieldId": row[0],
@@ -351,43 +499,90 @@ def check_field_exists(field_id: str) -> str:
                     "displayType": row[3],
                     "validationType": row[4],
                     "message": f"Field '{row[0]}' exists in database"
-                }, indent=2)
+                })
             else:
-                return json.dumps({
+                return _dumps({
                     "success": True,
                     "found": False,
                     "searchedFor": field_id,
                     "message": f"Field '{field_id}' not found in database"
-                }, indent=2)
+                })
                 
     except Exception as e:
-        return json.dumps({
+        return _dumps({
             "success": True,
             "found": False,
             "error": str(e),
             "error_type": type(e).__name__,
             "searchedFor": field_id,
             "message": f"Unable to check field '{field_id}' due to database error. You can choose to create it as a new field."
-        }, indent=2)
+        })
     
+@mcp.tool()
+def check_fields_exist_batch(field_ids: list[str]) -> str:
+    """
+    Check several field IDs against adminFields in one case-insensitive query.
+    Returns a check_field_exists-style entry per requested field ID.
+    """
+    try:
+        with _read_conn() as conn:
+            result = conn.execute(_Q_CHECK_FIELDS_BATCH, {"field_ids": [field_id.lower() for field_id in field_ids]})
+            rows = {row[0].lower(): row for row in result}
+            
+        fields = {}
+        for field_id in field_ids:
+            row = rows.get(field_id.lower())
+            if row:
+                fields[field_id] = {
+                    "found": True,
+                    "fieldId": row[0],
+                    "dataFieldId": row[1],
+                    "fieldType": row[2],
+                    "displayType": row[3],
+                    "validationType": row[4]
+                }
+            else:
+                fields[field_id] = {"found": False, "searchedFor": field_id}
+        
+        return _dumps({
+            "success": True,
+            "fields": fields,
+            "message": f"{sum(f['found'] for f in fields.values())} of {len(fields)} fields exist in database"
+        })
+                
+    except Exception as e:
+        return _dumps({
+            "success": True,
+            "fields": {field_id: {"found": False, "searchedFor": field_id} for field_id in field_ids},
+            "error": str(e),
+            "error_type": type(e).__name__,
+            "message": "Unable to check fields due to database error. You can choose to create them as new fields."
+        })
+
+@functools.lru_cache(maxsize=512)
+def _page_url_core(page_title: str) -> str:
+    """camelCase pageURL for a title; empty string when the title has no words"""
+    words = page_title.split()
+    if not words:
+        return ""
+    return words[0].lower() + ''.join(word.capitalize() for word in words[1:])
+
 @mcp.tool()
 def generate_page_url(page_title: str) -> str:
     """Generate valid pageURL from pageTitle (removes spaces, camelCase). Also returns pageDisplayName."""
     try:
-        words = page_title.split()
-        if not words:
-            return json.dumps({"success": False, "error": "Empty page title"}, indent=2)
+        page_url = _page_url_core(page_title)
+        if not page_url:
+            return _dumps({"success": False, "error": "Empty page title"})
         
-        page_url = words[0].lower() + ''.join(word.capitalize() for word in words[1:])
-        
-        return json.dumps({
+        return _dumps({
             "success": True,
             "pageTitle": page_title,
             "pageDisplayName": page_title,
             "pageURL": page_url
-        }, indent=2)
+        })
     except Exception as e:
-        return json.dumps({"success": False, "error": str(e)}, indent=2)
+        return _dumps({"success": False, "error": str(e)})
 
 @mcp.tool()
 def generate_form_page_sql(form_data_json: str) -> str:
@@ -432,7 +627,14 @@ def generate_form_page_sql(form_data_json: str) -> str:
     """
     try:
         form_data = json.loads(form_data_json)
-        sql_output = generate_sql_statements(form_data)
+        key = _hash_form(form_data, date.today().isoformat())
+        sql_output = _SQL_CACHE.get(key)
+        if sql_output is None:
+            sql_output = generate_sql_statements(form_data)
+            if len(_SQL_CACHE) >= _SQL_CACHE_MAX:
+                for old_key in list(_SQL_CACHE)[:_SQL_CACHE_MAX // 4]:
+                    _SQL_CACHE.pop(old_key, None)
+            _SQL_CACHE[key] = sql_output
         return sql_output
     except json.JSONDecodeError as e:
         return f"Error: Invalid JSON format - {str(e)}"
@@ -472,22 +674,21 @@ def validate_workflow_data(workflow_state: str) -> str:
         missing = [field for field, has_value in required_fields.items() if not has_value]
         is_valid = len(missing) == 0
         
-        return json.dumps({
+        return _dumps({
             "success": True,
             "is_valid": is_valid,
             "missing_fields": missing,
             "collected_fields": [field for field, has_value in required_fields.items() if has_value],
             "can_generate_sql": is_valid,
             "message": "All required data collected!" if is_valid else f"Missing: {', '.join(missing)}"
-        }, indent=2)
+        })
     except Exception as e:
-        return json.dumps({"success": False, "error": str(e)}, indent=2)
+        return _dumps({"success": False, "error": str(e)})
 
 
-@mcp.tool()
-def get_field_validation_types() -> str:
-    """Get list of valid validation types for field creation."""
-    validation_types = {
+_VALIDATION_TYPES_JSON = _dumps({
+    "success": True,
+    "validation_types": {
         "E": "Email - validates email format",
         "N": "Numeric - accepts only numbers",
         "M": "Mandatory - field is required",
@@ -496,31 +697,30 @@ def get_field_validation_types() -> str:
         "D": "Date - validates date format",
         "T": "Time - validates time format",
         "U": "URL - validates URL format"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "validation_types": validation_types,
-        "default": "E"
-    }, indent=2)
+    },
+    "default": "E"
+})
+
+@mcp.tool()
+def get_field_validation_types() -> str:
+    """Get list of valid validation types for field creation."""
+    return _VALIDATION_TYPES_JSON
 
 @mcp.tool()
 def generate_insert_template(table_name: str) -> str:
     """Generate a template INSERT statement with placeholders for values."""
     try:
-        with org_engine.connect() as conn:
-            result = conn.execute(text(f"DESCRIBE {table_name}"))
-            columns = [row[0] for row in result if "auto_increment" not in str(row[5]).lower()]
-            placeholders = [f"<{col}>" for col in columns]
-            sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(placeholders)});"
-            return sql
+        table = _resolve_table(table_name)
+        columns = [col["name"] for col in _inspector().get_columns(table) if col.get("autoincrement") is not True]
+        placeholders = [f"<{col}>" for col in columns]
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(placeholders)});"
+        return sql
     except Exception as e:
         return f"Error generating insert template: {str(e)}"
 
-@mcp.tool()
-def get_field_display_types() -> str:
-    """Get list of valid display types for field creation."""
-    display_types = {
+_DISPLAY_TYPES_JSON = _dumps({
+    "success": True,
+    "display_types": {
         "label": "Text label/input field",
         "checkbox": "Checkbox for boolean values",
         "radio": "Radio button for single selection",
@@ -529,61 +729,54 @@ def get_field_display_types() -> str:
         "date": "Date picker",
         "time": "Time picker",
         "file": "File upload"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "display_types": display_types,
-        "default": "label"
-    }, indent=2)
+    },
+    "default": "label"
+})
+
+@mcp.tool()
+def get_field_display_types() -> str:
+    """Get list of valid display types for field creation."""
+    return _DISPLAY_TYPES_JSON
 
 @mcp.tool()
 def search_value_in_table(table_name: str, search_column: str, search_value: str) -> str:
     """Search for a specific value in a table column and return if it exists."""
     try:
-        with org_engine.connect() as conn:
-            query = text(f"""
-                SELECT * FROM {table_name} 
-                WHERE {search_column} = :search_value
-                LIMIT 10
-            """)
+        table = _resolve_table(table_name)
+        query = _select_by_column(table, _resolve_column(table, search_column), 10)
+        with _read_conn() as conn:
             result = conn.execute(query, {"search_value": search_value})
-            columns = result.keys()
-            matches = [dict(zip(columns, row)) for row in result]
+            matches = [dict(row) for row in result.mappings()]
             
-            return json.dumps({
+            return _dumps({
                 "found": len(matches) > 0,
                 "count": len(matches),
                 "matches": matches
-            }, indent=2, default=str)
+            })
     except Exception as e:
-        return json.dumps({"found": False, "error": str(e)}, indent=2)
+        return _dumps({"found": False, "error": str(e)})
 
 @mcp.tool()
 def get_related_value(table_name: str, search_column: str, search_value: str, target_column: str) -> str:
     """Find a row by searching one column and return the value from another column."""
     try:
-        with org_engine.connect() as conn:
-            query = text(f"""
-                SELECT * FROM {table_name} 
-                WHERE {search_column} = :search_value
-                LIMIT 1
-            """)
+        table = _resolve_table(table_name)
+        query = _select_by_column(table, _resolve_column(table, search_column), 1)
+        with _read_conn() as conn:
             result = conn.execute(query, {"search_value": search_value})
-            columns = result.keys()
-            rows = [dict(zip(columns, row)) for row in result]
+            rows = [dict(row) for row in result.mappings()]
             
             if rows:
                 target_value = rows[0].get(target_column, None)
-                return json.dumps({
+                return _dumps({
                     "found": True,
                     "value": target_value,
                     "row_data": rows[0]
-                }, indent=2, default=str)
+                })
             else:
-                return json.dumps({"found": False, "value": None}, indent=2)
+                return _dumps({"found": False, "value": None})
     except Exception as e:
-        return json.dumps({"found": False, "error": str(e)}, indent=2)
+        return _dumps({"found": False, "error": str(e)})
 
 # Run the server
 if __name__ == "__main__":
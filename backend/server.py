@@ -0,0 +1,355 @@
+# server.py - FastAPI app factory shared by the API server entrypoints
+
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Response
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, ConfigDict, Field
+from prometheus_client import Histogram
+from prometheus_fastapi_instrumentator import Instrumentator
+from typing import Annotated, Any, Callable
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+import anyio
+import anyio.to_thread
+import logging
+import math
+import orjson
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+class ChatRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
+    message: Annotated[str, Field(max_length=8192)]
+
+class ChatResponse(BaseModel):
+    response: str
+    status: str = "success"
+
+class ResetResponse(BaseModel):
+    status: str
+    message: str
+
+# pydantic v2 compiles each model's core validator/serializer at class
+# creation; run one validation and one dump per hot model here so their
+# first-call costs land at import rather than on the first request.
+ChatRequest.__pydantic_validator__.validate_python({"message": ""})
+ChatResponse.__pydantic_serializer__.to_json(ChatResponse(response=""))
+_RESET_ACCEPTED = ResetResponse.__pydantic_serializer__.to_json(
+    ResetResponse(status="accepted", message="reset scheduled")
+)
+
+# The root payload only varies with readiness, so both bodies are serialized once.
+_ROOT_READY = orjson.dumps({
+    "message": "MCP AI Assistant API",
+    "status": "healthy",
+    "architecture": "MCP (FastMCP/SSE) + LangChain + Ollama"
+})
+_ROOT_INIT = orjson.dumps({
+    "message": "MCP AI Assistant API",
+    "status": "initializing",
+    "architecture": "MCP (FastMCP/SSE) + LangChain + Ollama"
+})
+
+# Time spent inside the assistant alone, so /metrics can split engine
+# (MCP + LLM) latency from the gateway's own request duration.
+ASSISTANT_CHAT_SECONDS = Histogram(
+    "assistant_chat_seconds",
+    "Time spent in assistant.chat() or chat_stream() per /chat request",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+
+class _TokenBuckets:
+    """In-process token buckets keyed by client, capped to the most recent keys.
+
+    Each worker keeps its own buckets; everything runs on the worker's event
+    loop, so no lock is needed.
+    """
+    def __init__(self, rate: float, burst: float, max_keys: int = 4096):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def take(self, key: str) -> float:
+        """Spend one token; return 0 if allowed, else seconds until the next token"""
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+        if not wait:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+def _client_key(request, trusted: frozenset) -> str:
+    """Rate-limit key: the client address as reported by a trusted proxy.
+
+    A Unix-socket peer has no address and is the co-located proxy by
+    construction, so it is trusted like the FORWARDED_ALLOW_IPS hosts; the
+    key is then the rightmost X-Forwarded-For hop that is not a proxy itself.
+    """
+    peer = request.client.host if request.client else None
+    if peer is None or peer in trusted or "*" in trusted:
+        for hop in reversed(request.headers.get("x-forwarded-for", "").split(",")):
+            hop = hop.strip()
+            if hop and hop not in trusted:
+                return hop
+    return peer or "unknown"
+
+def create_app(assistant_factory: Callable[[], Any]) -> FastAPI:
+    """Build the API app around an assistant class (mcpclient or clientreset)"""
+    # Built now, at import time of the entrypoint, so a gunicorn --preload
+    # master shares it with every worker; lifespan only reopens its connection.
+    # app.state.assistant is set once that succeeds and doubles as the
+    # readiness flag.
+    prebuilt_assistant = assistant_factory()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        """Manage application lifespan - initialize and cleanup"""
+        app.state.assistant = None
+        # Slots for in-flight LLM calls; sized to what the model can actually run
+        # in parallel (1 for a single-GPU Ollama) so extra /chat requests fail fast.
+        app.state.chat_slots = anyio.Semaphore(int(os.getenv("CHAT_CONCURRENCY", "1")))
+        # Sync handlers and any blocking LangChain/MCP calls run on AnyIO's
+        # default thread pool, which is capped at 40 threads out of the box.
+        anyio.to_thread.current_default_thread_limiter().total_tokens = int(os.getenv("ANYIO_THREADS", "100"))
+        app.state.tools_payload = {"tools": [], "status": "not_ready"}
+        app.state.tools_count = 0
+        app.state.reset_pending = False
+        try:
+            logger.info(" Initializing MCP AI Assistant...")
+            await prebuilt_assistant.reopen()
+            app.state.assistant = prebuilt_assistant
+            # The tool list is fixed once connected (reset only clears memory),
+            # so build the /tools and /health payloads once here.
+            app.state.tools_payload = {
+                "tools": [
+                    {"name": tool.name, "description": tool.description}
+                    for tool in prebuilt_assistant.tools
+                ],
+                "status": "ready"
+            }
+            app.state.tools_count = len(prebuilt_assistant.tools)
+            logger.info(" MCP AI Assistant ready!")
+            yield
+        except Exception as e:
+            logger.error(" Failed to initialize: %s", e)
+            logger.error("   Make sure mcpserver.py is running first!")
+            yield
+        finally:
+            logger.info(" Shutting down MCP AI Assistant...")
+            try:
+                await prebuilt_assistant.close()
+            except Exception as e:
+                logger.error("Error during cleanup: %s", e)
+            logger.info(" Shutdown complete!")
+
+    app = FastAPI(title="MCP AI Assistant API", lifespan=lifespan, default_response_class=ORJSONResponse)
+    app.state.assistant = None
+
+    # Per-client /chat rate limit, off unless CHAT_RATE_PER_SEC is set. Behind
+    # a proxy (or on UDS_PATH) every request arrives from the proxy, so the
+    # client is taken from X-Forwarded-For when the peer is listed in
+    # FORWARDED_ALLOW_IPS, the same setting uvicorn and gunicorn read.
+    chat_rate = os.getenv("CHAT_RATE_PER_SEC")
+    if chat_rate:
+        chat_buckets = _TokenBuckets(
+            rate=float(chat_rate),
+            burst=float(os.getenv("CHAT_BURST", "5")),
+        )
+        trusted_proxies = frozenset(
+            host.strip() for host in os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1").split(",") if host.strip()
+        )
+
+        # Registered before GZip/CORS so it sits innermost and 429s still carry
+        # CORS headers; it runs before any expensive LLM work.
+        @app.middleware("http")
+        async def rate_limit_chat(request, call_next):
+            if request.url.path == "/chat":
+                client = _client_key(request, trusted_proxies)
+                wait = chat_buckets.take(client)
+                if wait:
+                    logger.warning("Rate limited /chat for %s", client)
+                    return Response(status_code=429, headers={"Retry-After": str(math.ceil(wait))})
+            return await call_next(request)
+
+    # Compress larger bodies (/tools, long /chat replies). Added before CORS so it
+    # sits inside it; streamed replies opt out via Content-Encoding: identity.
+    app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+    # Explicit origins/methods/headers keep CORS on exact-match lookups, and
+    # max_age lets browsers cache preflights for /chat and /reset.
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[origin for origin in ("http://localhost:3000", os.getenv("FRONTEND_ORIGIN", "")) if origin],
+        allow_credentials=True,
+        allow_methods=["GET", "POST"],
+        allow_headers=["content-type", "authorization"],
+        max_age=86400,
+    )
+
+    # Per-endpoint duration, in-flight and response-size metrics on /metrics.
+    Instrumentator(excluded_handlers=["/health", "/metrics"]).instrument(app).expose(
+        app, endpoint="/metrics", include_in_schema=False
+    )
+
+    @app.get("/")
+    async def root():
+        """Root endpoint - health check"""
+        return Response(_ROOT_READY if app.state.assistant else _ROOT_INIT, media_type="application/json")
+
+    def _slot_releaser() -> Callable[[], None]:
+        """Release an already-acquired chat slot at most once"""
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                app.state.chat_slots.release()
+        return release
+
+    async def _stream_chat(assistant, message: str, release: Callable[[], None]):
+        """Relay the assistant reply as server-sent events while it is generated"""
+        try:
+            with ASSISTANT_CHAT_SECONDS.time():
+                async for chunk in assistant.chat_stream(message):
+                    yield b"data: " + orjson.dumps({"delta": chunk}) + b"\n\n"
+        finally:
+            release()
+
+    # No response_model: the reply is already a plain str, so it goes straight
+    # to orjson instead of through response validation. ChatResponse is still
+    # listed in `responses` to keep the OpenAPI schema.
+    @app.post("/chat", responses={200: {"model": ChatResponse}})
+    async def chat(request: ChatRequest, stream: bool = False):
+        """Chat endpoint - process user messages"""
+        assistant = app.state.assistant
+        if not assistant:
+            logger.error(" Assistant not initialized")
+            raise HTTPException(503, "Assistant not ready")
+
+        try:
+            app.state.chat_slots.acquire_nowait()
+        except anyio.WouldBlock:
+            logger.warning("Chat rejected: all LLM slots are busy")
+            raise HTTPException(503, "busy")
+
+        if stream:
+            # The slot is taken here so concurrent streams fail fast too. The
+            # generator's finally releases it; the background task covers a
+            # response whose body is never iterated (e.g. an early disconnect).
+            release = _slot_releaser()
+            logger.info("Streaming: %.50s...", request.message)
+            return StreamingResponse(
+                _stream_chat(assistant, request.message, release),
+                media_type="text/event-stream",
+                headers={"Content-Encoding": "identity"},
+                background=BackgroundTask(release),
+            )
+
+        try:
+            logger.info("Processing: %.50s...", request.message)
+            with ASSISTANT_CHAT_SECONDS.time():
+                response = await assistant.chat(request.message)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response generated (%d chars)", len(response))
+            return ORJSONResponse({"response": response, "status": "success"})
+        except Exception as e:
+            logger.error(" Chat error: %s", e, exc_info=True)
+            raise HTTPException(500, f"Error: {str(e)}")
+        finally:
+            app.state.chat_slots.release()
+
+    async def _run_reset(assistant):
+        """Background half of /reset; runs on the event loop after the 202 is sent"""
+        try:
+            assistant.reset()
+            logger.info("Ready for fresh conversation")
+        except Exception as e:
+            logger.error("Reset error: %s", e, exc_info=True)
+        finally:
+            app.state.reset_pending = False
+
+    @app.post("/reset", response_model=ResetResponse, status_code=202)
+    async def reset_conversation(background: BackgroundTasks):
+        """Reset endpoint - schedules a conversation reset and returns immediately"""
+        assistant = app.state.assistant
+        if not assistant:
+            logger.error("Assistant not initialized for reset")
+            raise HTTPException(503, "Assistant not ready")
+
+        # A burst of /reset calls collapses into the one already scheduled.
+        # Handlers and the task share the event loop, so a flag is enough.
+        if not app.state.reset_pending:
+            app.state.reset_pending = True
+            background.add_task(_run_reset, assistant)
+        return Response(_RESET_ACCEPTED, status_code=202, media_type="application/json")
+
+    @app.get("/health")
+    async def health():
+        """Health check endpoint"""
+        ready = app.state.assistant is not None
+        health_status = {
+            "status": "healthy" if ready else "initializing",
+            "assistant_connected": ready,
+            "tools": app.state.tools_count if ready else 0
+        }
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Health check: %r", health_status)
+        return health_status
+
+    @app.get("/tools")
+    async def list_tools():
+        """List available MCP tools"""
+        if not app.state.assistant:
+            logger.warning("Tools requested but assistant not ready")
+            return {"tools": [], "status": "not_ready"}
+
+        logger.info("Listed %d available tools", app.state.tools_count)
+        return app.state.tools_payload
+
+    return app
+
+def run(app_path: str):
+    """Dev launcher: serve the app at `app_path` ("module:attr") with uvicorn"""
+    import multiprocessing
+    import uvicorn
+
+    # Every worker runs its own lifespan and therefore holds its own assistant
+    # (and conversation memory), so the default stays at a single worker; with
+    # more, one user's turns land on workers with different memories.
+    # Set UVICORN_WORKERS=auto to size the pool as 2 * cores + 1.
+    workers = os.getenv("UVICORN_WORKERS", "1")
+    workers = 2 * multiprocessing.cpu_count() + 1 if workers == "auto" else max(1, int(workers))
+
+    # uvloop is not available on Windows; fall back to the default asyncio loop there.
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+
+    # A co-located frontend/proxy can talk over a Unix socket instead of
+    # loopback TCP; remote deployments leave UDS_PATH unset. Socket peers have
+    # no address, so an enabled CHAT_RATE_PER_SEC limit keys on the proxy's
+    # X-Forwarded-For header instead.
+    uds_path = os.getenv("UDS_PATH")
+    bind = {"uds": uds_path} if uds_path else {"host": "0.0.0.0", "port": 8001}
+
+    logger.info(" Starting MCP API Server with %d worker(s) on %s...", workers, uds_path or "0.0.0.0:8001")
+    uvicorn.run(
+        app_path,
+        **bind,
+        workers=workers,
+        loop=loop,
+        http="httptools",
+        interface="asgi3",
+        limit_concurrency=int(os.getenv("LIMIT_CONCURRENCY", "32")),
+        backlog=2048,
+    )
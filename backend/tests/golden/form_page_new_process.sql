@@ -0,0 +1,108 @@
+Organization: Acme (orgId: org-1)
+Process: Onboarding (processId: 400)
+Page: Task Details (pageId: 400)
+
+
+INSERT INTO orgProcesses (
+    recSeq, orgId, recStatus, processId, processName, processGroupCode, pageId, platformAccess, geoFenced, 
+    timeFenced, apiRouteName, externalURL, dataStatus, displaySeq, iconURL, isDefaultURL, fromDate, endDate, 
+    createdBy, createdOn, modifiedBy, modifiedOn
+) VALUES (
+    1, 'org-1', 'A', 400, 'Onboarding', NULL, 400, NULL, NULL, 
+    NULL, 'Onboarding', NULL, 'A', 0, NULL, 0, '2024-01-15', NULL, 
+    'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
+);
+
+
+INSERT INTO orgProcessEvents (
+    recSeq, orgId, recStatus, dataStatus, processId, eventId, eventName, eventGroupCode, pageId, eventProcessingFile, 
+    isMenu, platformAccess, timeFenced, showMenu, displaySeq, fromDate, endDate, createdBy, createdOn, 
+    modifiedBy, modifiedOn
+) VALUES (
+    1, 'org-1', 'A', 'A', 400, 400, 'Task Details', NULL, 400, '', 
+    'Y', NULL, NULL, 'Y', 10, '2024-01-15', NULL, 'ADMIN', CURRENT_TIMESTAMP, 
+    'ADMIN', CURRENT_TIMESTAMP
+);
+
+
+INSERT INTO adminPages (
+    pageId, recStatus, pageURL, pageTitle, pageDisplayName, processId, eventId, pageType, 
+    hideProcessEvents, pageSize, language, createdBy, createdOn, modifiedBy, modifiedOn
+) VALUES (
+    400, 'A', 'taskDetails', 'Task Details', 'Task Details', 400, 400, 'F', 
+    'Y', 12, 'en_US', 'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
+);
+
+
+INSERT INTO adminFormGroups (
+    groupId, recStatus, groupName, groupStatus, displayDivLength, displaySeq, 
+    createdBy, createdOn, modifiedBy, modifiedOn
+) VALUES (
+    7, 'A', 'Contact', 'A', 12, 0, 
+    'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
+);
+
+INSERT INTO adminFieldGroups (
+    fieldGroupId, recStatus, groupId, fieldGroupStatus, displayDivLength, displaySeq, 
+    createdBy, createdOn, modifiedBy, modifiedOn
+) VALUES
+(
+    7, 'A', 7, 'A', 12, 0, 
+    'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
+),
+(
+    8, 'A', 7, 'A', 12, 0, 
+    'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
+);
+
+INSERT INTO adminFields (
+    fieldId, recStatus, fieldType, fieldStatus, dataFieldId, remarks, fromDate, 
+    displayType, defaultValue, validationType, createdBy, createdOn, modifiedBy, modifiedOn
+) VALUES
+(
+    'zip_code', 'A', 'D', 'A', 'zip_code', '', '2024-01-15', 
+    'label', '', 'N', 'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
+),
+(
+    'notes', 'A', 'D', 'A', 'notes', '', '2024-01-15', 
+    'label', '', 'E', 'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
+);
+
+INSERT INTO orgPageValues (
+    pageId, recSeq, orgId, recStatus, groupId, fieldGroupId, fieldId, 
+    displayLabel, displayType, displaySubType, displayChannel, displayDivLength, displayLanguage, displaySeq, 
+    displayDataLength, labelAlignment, required, mandatory, pageValueStatus, dependsOn, dependsOnValue, isRelativeTimeZone, 
+    noWrap, isFilterable, sortable,  fromDate, helpText, defaultValue, validationType, 
+    createdBy, createdOn, modifiedBy, modifiedOn
+) VALUES
+(
+    400, 1, 'org-1', 'A', 7, 7, 'email', 
+    'Email', 
+    'label', 'search',
+    'D', 12, 'en_US', 10, 0,
+    'left', 'Y', 'Y', 'A','', NULL, 0, 'Y', 
+    NULL, NULL, '2024-01-15', '', '', 
+    'E', 
+    'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
+),
+(
+    400, 5, 'org-1', 'A', 7, 8, 'zip_code', 
+    'Zip Code', 
+    'label', 'search',
+    'D', 12, 'en_US', 10, 0,
+    'left', 'Y', 'Y', 'A','', NULL, 0, 'Y', 
+    NULL, NULL, '2024-01-15', '', '', 
+    'N', 
+    'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
+),
+(
+    400, 3, 'org-1', 'A', 7, 7, 'notes', 
+    'O''Brien Notes', 
+    'textarea', 'search',
+    'D', 12, 'en_US', 10, 0,
+    'left', 'Y', 'Y', 'A','', NULL, 0, 'Y', 
+    NULL, NULL, '2024-01-15', '', '', 
+    'NULL', 
+    'ADMIN', CURRENT_TIMESTAMP, 'ADMIN', CURRENT_TIMESTAMP
+);
+
@@ -0,0 +1,96 @@
+import asyncio
+
+import orjson
+import pytest
+
+import clientreset
+import mcpclient
+
+EXISTING = {
+    "email": {"found": True, "fieldId": "email", "displayType": "label", "validationType": "E"},
+    "first_name": {"found": True, "fieldId": "first_name", "displayType": "label", "validationType": "M"},
+}
+
+
+@pytest.fixture(params=[mcpclient, clientreset], ids=["mcpclient", "clientreset"])
+def assistant(request):
+    module = request.param
+    assistant = module.MCPAIAssistant()
+    assistant.memory.current_state = module.WorkflowState.FIELDS_NEEDED
+    calls = []
+
+    async def call_tool(name, args):
+        calls.append((name, args))
+        if name == "check_field_exists":
+            return orjson.dumps({"success": True, **EXISTING.get(args["field_id"], {"found": False})}).decode()
+        assert name == "check_fields_exist_batch"
+        fields = {field_id: EXISTING.get(field_id, {"found": False}) for field_id in args["field_ids"]}
+        return orjson.dumps({"success": True, "fields": fields}).decode()
+
+    assistant._call_tool = call_tool
+    assistant.calls = calls
+    return assistant
+
+
+def add_fields(assistant, user_input):
+    result = {}
+    asyncio.run(assistant._handle_fields_needed(user_input, user_input.lower(), result))
+    return result
+
+
+def known_field_ids(assistant):
+    field_ids = [field["field_id"] for field in assistant.memory.fields]
+    # clientreset queues unknown IDs for confirmation instead of adding them.
+    field_ids += getattr(assistant.memory, "queued_field_ids", [])
+    if getattr(assistant.memory, "pending_field_id", None):
+        field_ids.append(assistant.memory.pending_field_id)
+    return field_ids
+
+
+def test_batch_checks_all_ids_with_one_call(assistant):
+    result = add_fields(assistant, "email, zip_code phone")
+    assert assistant.calls == [("check_fields_exist_batch", {"field_ids": ["email", "zip_code", "phone"]})]
+    assert result["tool_name"] == "check_fields_exist_batch"
+    assert sorted(known_field_ids(assistant)) == ["email", "phone", "zip_code"]
+    assert [field["field_id"] for field in assistant.memory.existing_fields] == ["email"]
+
+
+def test_batch_drops_repeats_within_paste(assistant):
+    add_fields(assistant, "email, zip_code, email, ZIP_CODE")
+    assert assistant.calls[0][1] == {"field_ids": ["email", "zip_code"]}
+    assert sorted(known_field_ids(assistant)) == ["email", "zip_code"]
+
+
+def test_batch_skips_fields_already_added(assistant):
+    add_fields(assistant, "email, first_name")
+    add_fields(assistant, "first_name, email, phone")
+    assert assistant.calls[1][1] == {"field_ids": ["phone"]}
+    assert sorted(known_field_ids(assistant)) == ["email", "first_name", "phone"]
+
+
+def test_batch_of_only_known_ids_skips_tool_call(assistant):
+    add_fields(assistant, "email, first_name")
+    result = add_fields(assistant, "EMAIL, first_name")
+    assert len(assistant.calls) == 1
+    assert result["action_taken"] == "fields_already_added"
+    assert [field["field_id"] for field in assistant.memory.fields] == ["email", "first_name"]
+
+
+def test_phrase_is_not_a_batch(assistant):
+    add_fields(assistant, "I'm finished now")
+    assert assistant.calls == [("check_field_exists", {"field_id": "I'm finished now"})]
+
+
+def test_single_id_skips_field_already_added(assistant):
+    add_fields(assistant, "email")
+    result = add_fields(assistant, "Email")
+    assert assistant.calls == [("check_field_exists", {"field_id": "email"})]
+    assert result["action_taken"] == "fields_already_added"
+    assert [field["field_id"] for field in assistant.memory.fields] == ["email"]
+
+
+def test_batch_skips_field_added_singly(assistant):
+    add_fields(assistant, "email")
+    add_fields(assistant, "email, first_name")
+    assert assistant.calls[1] == ("check_fields_exist_batch", {"field_ids": ["first_name"]})
+    assert [field["field_id"] for field in assistant.memory.fields] == ["email", "first_name"]
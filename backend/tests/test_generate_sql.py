@@ -0,0 +1,68 @@
+import datetime
+import os
+from pathlib import Path
+
+import pytest
+
+# Importing mcpserver builds an engine; nothing here connects to it.
+os.environ.setdefault("ORG_MASTER_DB_URL", "sqlite://")
+import mcpserver
+
+GOLDEN = Path(__file__).parent / "golden" / "form_page_new_process.sql"
+
+FORM_DATA = {
+    "org_id": "org-1",
+    "org_name": "Acme",
+    "process_id": 400,
+    "process_name": "Onboarding",
+    "is_new_process": True,
+    "event_id": 400,
+    "page_id": 400,
+    "page_title": "Task Details",
+    "page_url": "taskDetails",
+    "event_name": "Task Details",
+    "group_id": 7,
+    "is_new_group": True,
+    "group_name": "Contact",
+    "field_groups": [7, 8],
+    "new_fields": [
+        {"field_id": "zip_code", "display_type": "label", "validation_type": "N"},
+        {"field_id": "notes"},
+    ],
+    "page_values": [
+        {"field_id": "email", "group_id": 7, "field_group_id": 7, "display_label": "Email",
+         "display_type": "label", "validation_type": "E"},
+        {"field_id": "zip_code", "group_id": 7, "field_group_id": 8, "display_label": "Zip Code",
+         "display_type": "label", "validation_type": "N", "rec_seq": 5},
+        {"field_id": "notes", "display_label": "O'Brien Notes", "display_type": "textarea",
+         "validation_type": None},
+    ],
+}
+
+
+class FixedDate(datetime.date):
+    @classmethod
+    def today(cls):
+        return cls(2024, 1, 15)
+
+
+@pytest.fixture(autouse=True)
+def fixed_today(monkeypatch):
+    monkeypatch.setattr(mcpserver, "date", FixedDate)
+
+
+def test_generate_sql_statements_matches_golden():
+    assert mcpserver.generate_sql_statements(FORM_DATA) == GOLDEN.read_text()
+
+
+def test_existing_process_skips_optional_sections():
+    form_data = dict(FORM_DATA, is_new_process=False, is_new_group=False, field_groups=[], new_fields=[])
+    sql = mcpserver.generate_sql_statements(form_data)
+    assert "INSERT INTO orgProcesses" not in sql
+    assert "INSERT INTO adminFormGroups" not in sql
+    assert "INSERT INTO adminFieldGroups" not in sql
+    assert "INSERT INTO adminFields" not in sql
+    # The remaining sections are unchanged, separators included.
+    golden = GOLDEN.read_text()
+    assert sql.startswith(golden[:golden.index("\n\n") + 2])
+    assert sql.endswith(golden[golden.index("INSERT INTO orgPageValues"):])
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+class StubAssistant:
+    tools = []
+
+    async def reopen(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def chat(self, message):
+        return "ok"
+
+
+def make_client(monkeypatch, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return TestClient(server.create_app(StubAssistant))
+
+
+def test_limiter_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("CHAT_RATE_PER_SEC", raising=False)
+    with make_client(monkeypatch) as client:
+        codes = {client.post("/chat", json={"message": "hi"}).status_code for _ in range(10)}
+    assert codes == {200}
+
+
+def test_limiter_keys_on_forwarded_client(monkeypatch):
+    with make_client(monkeypatch, CHAT_RATE_PER_SEC="0.001", CHAT_BURST="1", FORWARDED_ALLOW_IPS="testclient") as client:
+        def post(forwarded_for):
+            return client.post("/chat", json={"message": "hi"}, headers={"X-Forwarded-For": forwarded_for})
+
+        assert post("10.0.0.1").status_code == 200
+        assert post("10.0.0.1").status_code == 429
+        assert post("10.0.0.2").status_code == 200
+
+
+@pytest.mark.parametrize("peer, forwarded_for, expected", [
+    (None, "10.0.0.1", "10.0.0.1"),
+    ("127.0.0.1", "6.6.6.6, 10.0.0.1", "10.0.0.1"),
+    ("127.0.0.1", "", "127.0.0.1"),
+    ("10.0.0.9", "6.6.6.6", "10.0.0.9"),
+    (None, "", "unknown"),
+])
+def test_client_key(peer, forwarded_for, expected):
+    request = SimpleNamespace(
+        client=SimpleNamespace(host=peer) if peer else None,
+        headers={"x-forwarded-for": forwarded_for} if forwarded_for else {},
+    )
+    assert server._client_key(request, frozenset({"127.0.0.1"})) == expected
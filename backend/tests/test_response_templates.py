@@ -0,0 +1,91 @@
+import asyncio
+
+import orjson
+import pytest
+
+import clientcommon
+import clientreset
+import mcpclient
+
+MODULES = [mcpclient, clientreset]
+
+
+class NoLLM:
+    """Stands in for ChatOllama; any call fails the test"""
+    model = "none"
+
+    async def ainvoke(self, *args, **kwargs):
+        raise AssertionError("templated action reached the LLM")
+
+    async def astream(self, *args, **kwargs):
+        raise AssertionError("templated action reached the LLM")
+        yield
+
+
+def make_assistant(module, pending_field_id="zip_code"):
+    assistant = module.MCPAIAssistant()
+    assistant.session = object()
+    assistant.llm = NoLLM()
+    memory = assistant.memory
+    memory.org_id, memory.org_name = "org-1", "Acme"
+    memory.process_id, memory.process_name = 300, "Onboarding"
+    memory.event_id = memory.page_id = 306
+    memory.page_title, memory.page_url = "Task Details", "taskDetails"
+    memory.fields.append({"field_id": "email", "existing": True})
+    if module is clientreset:
+        memory.suggested_process_id = 400
+        memory.pending_field_id = pending_field_id
+    return assistant
+
+
+@pytest.mark.parametrize("module", MODULES, ids=lambda m: m.__name__)
+@pytest.mark.parametrize("stream", [False, True], ids=["chat", "chat_stream"])
+def test_every_templated_action_renders_from_memory(module, stream):
+    for action in module._RESPONSE_TEMPLATES:
+        assistant = make_assistant(module)
+
+        async def execute_state_logic(user_input, context, action=action):
+            return {"action_taken": action, "field_id": "email", "display_type": "label"}
+
+        assistant._execute_state_logic = execute_state_logic
+
+        async def turn():
+            if stream:
+                return "".join([chunk async for chunk in assistant.chat_stream("anything")])
+            return await assistant.chat("anything")
+
+        reply = asyncio.run(turn())
+        assert not reply.startswith("Error"), (action, reply)
+        assert "{" not in reply and "None" not in reply, (action, reply)
+        assert [message.content for message in assistant.conversation_history] == ["anything", reply]
+
+
+@pytest.mark.parametrize("module", MODULES, ids=lambda m: m.__name__)
+def test_organization_found_is_templated(module, monkeypatch):
+    monkeypatch.setattr(clientcommon.MCPAssistantBase, "_tool_cache", {})
+    assistant = module.MCPAIAssistant()
+    assistant.session = object()
+    assistant.llm = NoLLM()
+    assistant.memory.current_state = module.WorkflowState.ORG_NEEDED
+
+    async def call_tool_remote(tool_name, arguments):
+        assert tool_name == "get_organization_by_name"
+        return orjson.dumps({"success": True, "found": True, "orgId": "org-1", "legalName": "Acme"}).decode()
+
+    assistant._call_tool_remote = call_tool_remote
+    reply = asyncio.run(assistant.chat("Acme"))
+    assert reply == "Found Acme (ID: org-1). Which process should this form page belong to?"
+
+
+@pytest.mark.parametrize("module", MODULES, ids=lambda m: m.__name__)
+def test_fields_added_is_templated(module):
+    assistant = make_assistant(module, pending_field_id=None)
+    assistant.memory.current_state = module.WorkflowState.FIELDS_NEEDED
+
+    async def call_tool_remote(tool_name, arguments):
+        fields = {field_id: {"found": True, "fieldId": field_id} for field_id in arguments["field_ids"]}
+        return orjson.dumps({"success": True, "fields": fields}).decode()
+
+    assistant._call_tool_remote = call_tool_remote
+    reply = asyncio.run(assistant.chat("first_name, last_name"))
+    assert reply == "Fields first_name, last_name added (3 total). Add another field or say 'done'."
@@ -0,0 +1,83 @@
+import asyncio
+
+import orjson
+import pytest
+
+import clientcommon
+import mcpclient
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(clientcommon.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def assistant(monkeypatch):
+    monkeypatch.setattr(clientcommon.MCPAssistantBase, "_tool_cache", {})
+    assistant = mcpclient.MCPAIAssistant()
+    assistant.calls = []
+    assistant.replies = {}
+
+    async def call_tool_remote(tool_name, arguments):
+        assistant.calls.append((tool_name, arguments))
+        reply = assistant.replies.get(tool_name, {"success": True, "found": True, "n": len(assistant.calls)})
+        return orjson.dumps(reply).decode()
+
+    assistant._call_tool_remote = call_tool_remote
+    return assistant
+
+
+def call(assistant, tool_name, arguments):
+    return asyncio.run(assistant._call_tool(tool_name, arguments))
+
+
+def test_hit_within_ttl(assistant, clock):
+    first = call(assistant, "get_organization_by_name", {"legal_name": "Acme"})
+    clock[0] += 59
+    assert call(assistant, "get_organization_by_name", {"legal_name": "Acme"}) == first
+    assert len(assistant.calls) == 1
+
+
+def test_argument_order_shares_entry(assistant, clock):
+    call(assistant, "get_process_by_name", {"process_name": "Onboarding", "org_id": "org-1"})
+    call(assistant, "get_process_by_name", {"org_id": "org-1", "process_name": "Onboarding"})
+    assert len(assistant.calls) == 1
+
+
+def test_miss_after_ttl(assistant, clock):
+    first = call(assistant, "get_process_by_name", {"process_name": "Onboarding", "org_id": "org-1"})
+    clock[0] += clientcommon._TOOL_CACHE_TTL["get_process_by_name"] + 1
+    assert call(assistant, "get_process_by_name", {"process_name": "Onboarding", "org_id": "org-1"}) != first
+    assert len(assistant.calls) == 2
+
+
+def test_uncached_tool_always_calls_server(assistant, clock):
+    call(assistant, "generate_page_url", {"page_title": "Task Details"})
+    call(assistant, "generate_page_url", {"page_title": "Task Details"})
+    assert len(assistant.calls) == 2
+
+
+@pytest.mark.parametrize("reply", [
+    {"success": False, "error": "connection lost"},
+    {"success": True, "found": False, "error": "lookup failed"},
+    {"success": False},
+])
+def test_failures_are_not_cached(assistant, clock, reply):
+    assistant.replies["check_field_exists"] = reply
+    call(assistant, "check_field_exists", {"field_id": "email"})
+    call(assistant, "check_field_exists", {"field_id": "email"})
+    assert len(assistant.calls) == 2
+
+
+def test_oldest_entry_evicted_when_full(assistant, clock, monkeypatch):
+    monkeypatch.setattr(clientcommon, "_TOOL_CACHE_MAX", 2)
+    for name in ("a", "b", "c"):
+        call(assistant, "check_field_exists", {"field_id": name})
+    call(assistant, "check_field_exists", {"field_id": "c"})
+    call(assistant, "check_field_exists", {"field_id": "b"})
+    assert len(assistant.calls) == 3
+    call(assistant, "check_field_exists", {"field_id": "a"})
+    assert len(assistant.calls) == 4